@@ -0,0 +1,40 @@
+"""
+Airspeed -> stepper step math for monitor.py.
+
+Compiled with Numba when it is installed (pip install numba); otherwise the
+same functions run as plain Python.
+"""
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that returns the function unchanged"""
+        if args and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+
+@njit(cache=True)
+def airspeed_to_steps(airspeed, kt_min, kt_max, angle_min, angle_max, steps_per_deg):
+    """Return (dial angle, target step) for an airspeed using linear interpolation"""
+    angle = angle_min + (airspeed - kt_min) / (kt_max - kt_min) * (angle_max - angle_min)
+    return angle, int((angle % 360.0) * steps_per_deg + 0.5)
+
+
+@njit(cache=True)
+def shortest_move(target_steps, current_steps, steps_per_rotation):
+    """Return (signed steps to move, normalized target) along the shortest way round the dial"""
+    target_steps = target_steps % steps_per_rotation
+    steps_to_move = target_steps - current_steps % steps_per_rotation
+    half = steps_per_rotation >> 1
+    if steps_to_move > half:
+        steps_to_move -= steps_per_rotation
+    elif steps_to_move < -half:
+        steps_to_move += steps_per_rotation
+    return steps_to_move, target_steps
+
+
+def warm_up():
+    """Call each function once so JIT compilation doesn't land on the first packet"""
+    airspeed_to_steps(100.0, 40.0, 200.0, 30.0, 330.0, 1600 / 360.0)
+    shortest_move(0, 0, 1600)
@@ -2,12 +2,19 @@
 """Diagnostic tool to check device connectivity and configuration"""
 import json
 import os
+import select
 import socket
 import time
 
 DEVICES_FILE = 'esp_devices.json'
 MAPPING_FILE = 'instrument_mapping.json'
 
+# Kernel UDP buffer limits needed by rpi_hub's 12 MB SO_RCVBUF
+NET_SYSCTLS = {
+    'net.core.rmem_max': 12582912,
+    'net.core.netdev_max_backlog': 5000,
+}
+
 def load_json(filename):
     if os.path.exists(filename):
         try:
@@ -18,19 +25,57 @@ def load_json(filename):
             return {}
     return {}
 
-def check_device_connectivity(ip, port=49003, timeout=2):
-    """Check if a device is reachable on the network"""
+def check_network_buffers():
+    """Warn if kernel UDP buffer limits are below what rpi_hub requests"""
+    low = []
+    for name, wanted in NET_SYSCTLS.items():
+        path = '/proc/sys/' + name.replace('.', '/')
+        try:
+            with open(path, 'r') as f:
+                current = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        if current < wanted:
+            print(f"⚠ {name} = {current} (want >= {wanted})")
+            low.append(f"{name}={wanted}")
+    if low:
+        print(f"  Fix: sudo sysctl -w {' '.join(low)}\n")
+
+def check_device_connectivity(ips, port=49003, timeout=2):
+    """Send PING to every IP from one socket and return {ip: replied}"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    reachable = dict.fromkeys(ips, False)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(timeout)
-        sock.sendto(b'PING', (ip, port))
+        for ip in ips:
+            try:
+                sock.sendto(b'PING', (ip, port))
+            except OSError:
+                pass
+
+        # One wait window for all replies instead of one timeout per device
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            r, _, _ = select.select([sock], [], [], remaining)
+            if not r:
+                break
+            try:
+                _, addr = sock.recvfrom(1024)
+            except (BlockingIOError, ConnectionRefusedError):
+                continue
+            # Only a reply from the pinged address counts
+            if addr[0] in reachable:
+                reachable[addr[0]] = True
+    finally:
         sock.close()
-        return True
-    except:
-        return False
+    return reachable
 
 def main():
     print("=== Device Diagnostic ===\n")
+    check_network_buffers()
     
     # Load configurations
     devices = load_json(DEVICES_FILE)
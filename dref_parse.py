@@ -0,0 +1,25 @@
+"""
+Parser for X-Plane DREF+ UDP packets, shared by rpi_hub.py and the monitor scripts.
+
+Packet layout: b'DREF+' (5 bytes) + little-endian float (4 bytes) + null-terminated dataref name
+"""
+import struct
+
+DREF_HEADER = b'DREF+'
+_S = struct.Struct('<f')
+
+
+def parse_dref(data):
+    """Return (field, value) for a DREF+ packet, or None if data is not one"""
+    if len(data) < 9 or not data.startswith(DREF_HEADER):
+        return None
+    value = _S.unpack_from(data, 5)[0]
+    end = data.find(b'\x00', 9)
+    field = data[9:end if end >= 0 else len(data)].decode('ascii', errors='replace')
+    return field, value
+
+
+try:
+    from fastparse import parse_dref  # Compiled build of the function above, if present
+except ImportError:
+    pass
@@ -0,0 +1,26 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Cython build of dref_parse.parse_dref. dref_parse uses it when compiled:
+
+    pip install cython && cythonize -i fastparse.pyx
+"""
+from libc.string cimport memchr, memcmp, memcpy
+
+
+cpdef tuple parse_dref(const unsigned char[::1] data):
+    """Return (field, value) for a DREF+ packet, or None if data is not one"""
+    cdef Py_ssize_t n = data.shape[0]
+    cdef const unsigned char* base
+    cdef const unsigned char* end
+    cdef Py_ssize_t length
+    cdef float value
+
+    if n < 9:
+        return None
+    base = &data[0]
+    if memcmp(base, b"DREF+", 5) != 0:
+        return None
+    memcpy(&value, base + 5, 4)  # X-Plane sends little-endian; so are the Pi and x86 hosts
+    end = <const unsigned char*>memchr(base + 9, 0, n - 9)
+    length = end - (base + 9) if end != NULL else n - 9
+    return (<const char*>base + 9)[:length].decode('ascii', 'replace'), value
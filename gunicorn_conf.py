@@ -0,0 +1,10 @@
+"""
+Gunicorn settings for the web dashboard (used by start.sh):
+
+    gunicorn -c gunicorn_conf.py web_server:app
+"""
+bind = '0.0.0.0:5000'  # rpi_hub posts to localhost:5000 and browsers connect directly; no proxy in front
+workers = 1            # Dashboard state (counters, encoder events, calibrations) lives in process memory
+worker_class = 'gthread'
+threads = 8
+worker_tmp_dir = '/dev/shm'  # Worker heartbeat file on tmpfs instead of the SD card
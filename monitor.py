@@ -4,10 +4,21 @@ and translating airspeed value to NEMA 11 stepper motor rotation
 through DRV8825 stepper motor controller.
 """
 import sys
+import os
+import logging
 import socket
-import struct
 import RPi.GPIO as GPIO
+try:
+    import pigpio  # Optional: DMA-timed step pulses when the pigpiod daemon is running
+except ImportError:
+    pigpio = None
+import queue
 import time
+from threading import Thread
+from dref_parse import parse_dref
+from airspeed_math import airspeed_to_steps, shortest_move, warm_up
+
+log = logging.getLogger('monitor')
 
 # GPIO configuration
 DIR_PIN = 20  # Direction: CW=0, CCW=1
@@ -31,6 +42,8 @@ RESOLUTION = {
 
 CURRENT_RESOLUTION = '1/8'  # Change this to adjust sensitivity
 
+RCVBUF_SIZE = 12 * 1024 * 1024  # UDP receive buffer so bursts survive long moves
+
 # GPIO initialization
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(MODE_PINS, GPIO.OUT)
@@ -40,6 +53,24 @@ GPIO.output(MODE_PINS, RESOLUTION[CURRENT_RESOLUTION])
 GPIO.output(DIR_PIN, GPIO.LOW)  # Initialize to CW
 GPIO.output(STEP_PIN, GPIO.LOW)
 
+# Step pulses come from the pigpio daemon (DMA-timed) when it's reachable; without it
+# (no pigpio, pigpiod not running, or a Pi 5) they are timed in Python through RPi.GPIO
+STEP_PULSE_US = 500  # High and low time of each STEP pulse (1 kHz step rate)
+
+pi = None
+STEP_WAVE = None
+if pigpio is not None:
+    _pi = pigpio.pi()
+    if _pi.connected:
+        pi = _pi
+        pi.set_mode(STEP_PIN, pigpio.OUTPUT)
+        pi.wave_clear()
+        pi.wave_add_generic([
+            pigpio.pulse(1 << STEP_PIN, 0, STEP_PULSE_US),
+            pigpio.pulse(0, 1 << STEP_PIN, STEP_PULSE_US),
+        ])
+        STEP_WAVE = pi.wave_create()  # One full STEP pulse, repeated by wave_chain
+
 # Stepper motor configuration
 MICROSTEP_FACTOR = {
     'Full': 1,
@@ -50,35 +81,21 @@ MICROSTEP_FACTOR = {
     '1/32': 32,
 }
 STEP_ANGLE = 1.8 / MICROSTEP_FACTOR[CURRENT_RESOLUTION]  # degrees per step
+STEPS_PER_ROTATION = round(360 / STEP_ANGLE)
+_STEPS_PER_DEGREE = STEPS_PER_ROTATION / 360.0
 
 # Airspeed dial calibration
 AIRSPEED_40KT_ANGLE = 30  # degrees (1 pm position)
 AIRSPEED_200KT_ANGLE = 330  # degrees (11 pm position)
 AIRSPEED_MIN = 40  # knots
 AIRSPEED_MAX = 200  # knots
+# Fixed arguments to airspeed_to_steps, as floats so the JIT compiles one signature
+_AIRSPEED_ARGS = (float(AIRSPEED_MIN), float(AIRSPEED_MAX),
+                  float(AIRSPEED_40KT_ANGLE), float(AIRSPEED_200KT_ANGLE), _STEPS_PER_DEGREE)
 
 # Motor state
 current_position = 0  # current position in steps (0 = 0 degrees)
 
-def airspeed_to_angle(airspeed_knots):
-    """
-    Convert true airspeed to dial angle.
-    Linear interpolation between calibration points.
-    """
-    # Linear mapping: 40 knots = 30°, 200 knots = 330°
-    angle = AIRSPEED_40KT_ANGLE + (airspeed_knots - AIRSPEED_MIN) / (AIRSPEED_MAX - AIRSPEED_MIN) * (AIRSPEED_200KT_ANGLE - AIRSPEED_40KT_ANGLE)
-    return angle
-
-def angle_to_steps(angle_degrees):
-    """
-    Convert dial angle to stepper motor steps.
-    Normalizes to 0-360° range.
-    """
-    # Normalize angle to 0-360°
-    angle_degrees = angle_degrees % 360
-    steps = round(angle_degrees / STEP_ANGLE)
-    return steps
-
 def move_stepper(target_steps):
     """
     Move stepper motor to target position using GPIO 20 (direction) and 21 (steps).
@@ -87,62 +104,71 @@ def move_stepper(target_steps):
     """
     global current_position
     
-    # Normalize both positions to single rotation (0 to steps per rotation)
-    steps_per_rotation = round(360 / STEP_ANGLE)
-    target_steps = target_steps % steps_per_rotation
-    current_normalized = current_position % steps_per_rotation
-    
-    steps_to_move = target_steps - current_normalized
-    
-    # Calculate shortest path on circular dial
-    if steps_to_move > steps_per_rotation / 2:
-        steps_to_move -= steps_per_rotation
-    elif steps_to_move < -steps_per_rotation / 2:
-        steps_to_move += steps_per_rotation
+    # Shortest path on circular dial, both positions normalized to one rotation
+    steps_to_move, target_steps = shortest_move(target_steps, current_position, STEPS_PER_ROTATION)
     
     if steps_to_move == 0:
         return
     
+    # Let the previous pulse train finish before changing direction
+    while is_busy():
+        time.sleep(0.001)
+    
     # Set direction: CW=0, CCW=1
     direction = CCW if steps_to_move < 0 else CW
     GPIO.output(DIR_PIN, direction)
     
     steps_to_move = abs(steps_to_move)
     
-    # Send step pulses
-    for _ in range(steps_to_move):
-        GPIO.output(STEP_PIN, GPIO.HIGH)
-        time.sleep(0.001)  # 1ms pulse width
-        GPIO.output(STEP_PIN, GPIO.LOW)
-        time.sleep(0.001)  # 1ms delay between steps
+    if pi is not None:
+        # Send step pulses: loop STEP_WAVE steps_to_move times (returns immediately)
+        pi.wave_chain([
+            255, 0,
+            STEP_WAVE,
+            255, 1, steps_to_move & 0xFF, steps_to_move >> 8,
+        ])
+    else:
+        pulse_steps(steps_to_move)
     
     current_position = target_steps
 
-def parse_dref_message(data):
-    """
-    Parse DREF message format: DREF + 4 bytes (decimal) + field name
-    """
-    data_stripped = data.rstrip(b'\x00')
-    
-    if len(data_stripped) < 9:  # "DREF" (4) + 4 bytes + at least 1 char for name
-        return None
-    
-    # Check for DREF header
-    if data_stripped[:5] != b'DREF+':
-        return None
-    
-    # Extract 4-byte decimal value
-    decimal_bytes = data_stripped[5:9]
-    decimal_value = struct.unpack('<f', decimal_bytes)[0]  # Little-endian 
-    
-    # Extract field name (rest of the data after position 8)
-    field_name = data_stripped[9:].decode('ascii', errors='replace')
-    
-    return {
-        'data': data_stripped,
-        'decimal': decimal_value,
-        'field_name': field_name
-    }
+def pulse_steps(steps):
+    """Send step pulses from Python, sleeping to a running deadline so jitter doesn't accumulate"""
+    half_period = STEP_PULSE_US / 1000000
+    monotonic = time.monotonic
+    deadline = monotonic()
+    for _ in range(steps):
+        for level in (GPIO.HIGH, GPIO.LOW):
+            GPIO.output(STEP_PIN, level)
+            deadline += half_period
+            remaining = deadline - monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+
+def is_busy():
+    """Return True while a step pulse train is still being transmitted"""
+    return pi is not None and bool(pi.wave_tx_busy())
+
+def post_latest(mailbox, item):
+    """Put item in a single-slot mailbox, replacing any value not yet consumed"""
+    while True:
+        try:
+            mailbox.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            mailbox.put_nowait(item)
+            return
+        except queue.Full:
+            continue
+
+def motor_worker(mailbox):
+    """Move the stepper to each target posted to the mailbox; None stops the worker"""
+    while True:
+        target_steps = mailbox.get()
+        if target_steps is None:
+            break
+        move_stepper(target_steps)
 
 def capture_xplane_data(port=49001, host='0.0.0.0'):
     """
@@ -151,11 +177,19 @@ def capture_xplane_data(port=49001, host='0.0.0.0'):
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     sock.bind((host, port))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF_SIZE)
     
-    print(f"Listening for X-Plane data on {host}:{port}")
-    print("Initializing motor to 0 degrees...")
+    log.info("Listening for X-Plane data on %s:%d", host, port)
+    warm_up()  # Compile the step math before the first packet arrives
+    log.info("Initializing motor to 0 degrees...")
     move_stepper(0)  # Move to home position
-    print("Press Ctrl+C to stop...\n")
+    log.info("Press Ctrl+C to stop...\n")
+    
+    # Receiving and stepping run in separate threads so long moves never
+    # back up the socket; only the newest target is kept
+    mailbox = queue.Queue(maxsize=1)
+    worker = Thread(target=motor_worker, args=(mailbox,), daemon=True)
+    worker.start()
     
     try:
         packet_num = 0
@@ -163,36 +197,37 @@ def capture_xplane_data(port=49001, host='0.0.0.0'):
             data, addr = sock.recvfrom(4096)
             packet_num += 1
             
-            parsed = parse_dref_message(data)
-            
-            print(f"--- Packet #{packet_num} ---")
-            print(f"Source: {addr}")
+            parsed = parse_dref(data)
+            debug = log.isEnabledFor(logging.DEBUG)
 
             if parsed:
-                print(f"Message Type: DREF")
-                print(f"Airspeed: {parsed['decimal']:.2f} knots")
-                print(f"Field Name: {parsed['field_name']}")
+                field_name, airspeed = parsed
                 
                 # Convert airspeed to motor steps and move
-                angle = airspeed_to_angle(parsed['decimal'])
-                target_steps = angle_to_steps(angle)
-                print(f"Target Angle: {angle:.2f}°, Motor Steps: {target_steps}")
-                move_stepper(target_steps)
-            else:
+                angle, target_steps = airspeed_to_steps(airspeed, *_AIRSPEED_ARGS)
+                post_latest(mailbox, target_steps)
+                if debug:
+                    log.debug("--- Packet #%d from %s: DREF %s = %.2f knots -> %.2f°, %d steps",
+                              packet_num, addr, field_name, airspeed, angle, target_steps)
+            elif debug:
                 # Fallback for non-DREF messages
                 data_stripped = data.rstrip(b'\x00')
-                print("Message Type: Unknown")
-                print(f"Size: {len(data)} bytes")
-                print(f"Hex: {data_stripped.hex()}")
-                print(f"Raw: {data_stripped}")
-            print()
+                log.debug("--- Packet #%d from %s: Unknown, %d bytes, hex %s",
+                          packet_num, addr, len(data), data_stripped.hex())
     except KeyboardInterrupt:
-        print("\nStopped listening.")
+        log.info("\nStopped listening.")
     finally:
+        post_latest(mailbox, None)
+        worker.join()
+        if pi is not None:
+            pi.wave_tx_stop()
+            pi.wave_delete(STEP_WAVE)
+            pi.stop()
         GPIO.cleanup()
         sock.close()
-        sock.close()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG if os.environ.get('SIXPACK_DEBUG') == '1' else logging.INFO,
+                        format='%(message)s')
     capture_xplane_data()
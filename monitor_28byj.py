@@ -5,12 +5,19 @@ Monitor airspeed DREF messages from X-Plane and control a 28BYJ-48 stepper motor
 """
 
 import sys
+import bisect
 import socket
-import struct
 import time
 import os
+import logging
+import queue
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Thread
 from stepper_28byj import Stepper28BYJ48, CW, CCW
+from dref_parse import parse_dref
+
+log = logging.getLogger('monitor_28byj')
 
 # Detect if running in Docker
 IN_DOCKER = os.path.exists('/.dockerenv')
@@ -19,12 +26,24 @@ IN_DOCKER = os.path.exists('/.dockerenv')
 MOTOR_DELAY = 0.002  # 2ms delay between steps
 MOTOR_RESOLUTION = 'full'  # 'full' or 'half'
 
+RCVBUF_SIZE = 12 * 1024 * 1024  # UDP receive buffer so bursts survive long moves
+
+# Web server updates reuse one keep-alive connection and are posted from a
+# background worker so a slow server never blocks the UDP reader
+WEB_SERVER_URL = 'http://localhost:5000'
+_http = requests.Session()
+_http.mount('http://', requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4))
+_post_pool = ThreadPoolExecutor(max_workers=1)
+_post_slots = BoundedSemaphore(64)  # Drop updates when this many are pending
+
 # Calibration points will be loaded from web server
 CALIBRATION_POINTS = []
+_CAL_V = []  # Calibration airspeeds (sorted), parallel to _CAL_A
+_CAL_A = []  # Calibration angles
 
 def load_calibration():
     try:
-        r = requests.get('http://localhost:5000/api/calibration/ESP_Airspeed', timeout=1)
+        r = _http.get(WEB_SERVER_URL + '/api/calibration/ESP_Airspeed', timeout=1)
         if r.status_code == 200:
             cal = r.json()
             if 'points' in cal:
@@ -37,74 +56,88 @@ def airspeed_to_angle(airspeed_knots):
     """
     Convert indicated airspeed to dial angle using calibration points.
     """
-    if not CALIBRATION_POINTS:
+    if not _CAL_V:
         return 90
-    if airspeed_knots <= CALIBRATION_POINTS[0][0]:
-        k1, a1 = CALIBRATION_POINTS[0]
-        k2, a2 = CALIBRATION_POINTS[1]
-        return a1 + (airspeed_knots - k1) * (a2 - a1) / (k2 - k1)
-    if airspeed_knots >= CALIBRATION_POINTS[-1][0]:
-        k1, a1 = CALIBRATION_POINTS[-2]
-        k2, a2 = CALIBRATION_POINTS[-1]
-        return a2 + (airspeed_knots - k2) * (a2 - a1) / (k2 - k1)
-    for i in range(len(CALIBRATION_POINTS) - 1):
-        k1, a1 = CALIBRATION_POINTS[i]
-        k2, a2 = CALIBRATION_POINTS[i + 1]
-        if k1 <= airspeed_knots <= k2:
-            return a1 + (airspeed_knots - k1) * (a2 - a1) / (k2 - k1)
-    return CALIBRATION_POINTS[0][1]
-
-def parse_dref_message(data):
-    """
-    Parse DREF message format: DREF + 4 bytes (decimal) + field name
-    """
-    data_stripped = data.rstrip(b'\x00')
-    
-    if len(data_stripped) < 9:  # "DREF" (4) + 4 bytes + at least 1 char for name
-        return None
-    
-    # Check for DREF header
-    if data_stripped[:5] != b'DREF+':
-        return None
-    
-    # Extract 4-byte decimal value
-    decimal_bytes = data_stripped[5:9]
-    decimal_value = struct.unpack('<f', decimal_bytes)[0]  # Little-endian float
-    
-    # Extract field name (rest of the data after position 8)
-    field_name = data_stripped[9:].decode('ascii', errors='replace')
-    
-    return {
-        'data': data_stripped,
-        'decimal': decimal_value,
-        'field_name': field_name
-    }
+    i = bisect.bisect_left(_CAL_V, airspeed_knots)
+    if i == 0:
+        i = 1  # Below the first point: extrapolate along the first segment
+    elif i >= len(_CAL_V):
+        i = len(_CAL_V) - 1  # Above the last point: extrapolate along the last segment
+    k1, k2 = _CAL_V[i - 1], _CAL_V[i]
+    a1, a2 = _CAL_A[i - 1], _CAL_A[i]
+    return a1 + (airspeed_knots - k1) * (a2 - a1) / (k2 - k1)
+
+def _post_done(future):
+    _post_slots.release()
+    e = future.exception()
+    if e:
+        log.warning("Failed to send to web server: %s", e)
+
+def post_webserver(path, payload):
+    """Queue a POST to the web server without waiting for the response"""
+    if not _post_slots.acquire(blocking=False):
+        return
+    _post_pool.submit(_http.post, WEB_SERVER_URL + path, json=payload, timeout=1).add_done_callback(_post_done)
+
+def post_latest(mailbox, item):
+    """Put item in a single-slot mailbox, replacing any value not yet consumed"""
+    while True:
+        try:
+            mailbox.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            mailbox.put_nowait(item)
+            return
+        except queue.Full:
+            continue
+
+def motor_worker(motor, mailbox):
+    """Move the motor to each angle posted to the mailbox; None stops the worker"""
+    while True:
+        angle = mailbox.get()
+        if angle is None:
+            break
+        if IN_DOCKER:
+            log.info("[MOTOR] Move to %.2f°", angle)
+        else:
+            motor.move_to(angle)
+            log.debug("Current Position: %.2f°", motor.get_position())
 
 def capture_xplane_data(port=49001, host='0.0.0.0'):
     """
     Capture and parse DREF messages from X-Plane and control 28BYJ stepper motor.
     """
-    global CALIBRATION_POINTS
-    CALIBRATION_POINTS = load_calibration()
-    print(f"Loaded calibration points: {CALIBRATION_POINTS}")
+    global CALIBRATION_POINTS, _CAL_V, _CAL_A
+    CALIBRATION_POINTS = sorted(load_calibration())
+    _CAL_V = [k for k, _ in CALIBRATION_POINTS]
+    _CAL_A = [a for _, a in CALIBRATION_POINTS]
+    log.info("Loaded calibration points: %s", CALIBRATION_POINTS)
     
     # Initialize motor
-    print(f"Initializing 28BYJ-48 stepper motor (resolution: {MOTOR_RESOLUTION})...")
+    log.info("Initializing 28BYJ-48 stepper motor (resolution: %s)...", MOTOR_RESOLUTION)
     if IN_DOCKER:
-        print("[DOCKER MODE] GPIO output disabled, using stdout")
+        log.info("[DOCKER MODE] GPIO output disabled, using stdout")
     motor = Stepper28BYJ48(delay=MOTOR_DELAY, resolution=MOTOR_RESOLUTION)
     
     # Move to home position (0 degrees)
-    print("Moving to home position (0 degrees)...")
+    log.info("Moving to home position (0 degrees)...")
     motor.move_to(0)
     
     # Initialize UDP socket
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     sock.bind((host, port))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF_SIZE)
+    
+    log.info("\nListening for X-Plane data on %s:%d", host, port)
+    log.info("Press Ctrl+C to stop...\n")
     
-    print(f"\nListening for X-Plane data on {host}:{port}")
-    print("Press Ctrl+C to stop...\n")
+    # Receiving and stepping run in separate threads so long moves never
+    # back up the socket; only the newest target angle is kept
+    mailbox = queue.Queue(maxsize=1)
+    worker = Thread(target=motor_worker, args=(motor, mailbox), daemon=True)
+    worker.start()
     
     last_airspeed = None
     try:
@@ -113,16 +146,12 @@ def capture_xplane_data(port=49001, host='0.0.0.0'):
             data, addr = sock.recvfrom(4096)
             packet_num += 1
             
-            parsed = parse_dref_message(data)
-            
-            print(f"--- Packet #{packet_num} ---")
-            print(f"Source: {addr}")
+            parsed = parse_dref(data)
 
             if parsed:
-                print(f"Message Type: DREF")
-                airspeed = parsed['decimal']
-                print(f"Airspeed: {airspeed:.2f} knots")
-                print(f"Field Name: {parsed['field_name']}")
+                field_name, airspeed = parsed
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("--- Packet #%d from %s: DREF %s = %.2f knots", packet_num, addr, field_name, airspeed)
                 
                 # Only move if airspeed changed by more than 1 knot
                 if last_airspeed is None or abs(airspeed - last_airspeed) > 1:
@@ -130,33 +159,26 @@ def capture_xplane_data(port=49001, host='0.0.0.0'):
                     
                     # Convert airspeed to motor angle and move
                     angle = airspeed_to_angle(airspeed)
-                    print(f"Target Angle: {angle:.2f}°")
-                    
-                    if IN_DOCKER:
-                        print(f"[MOTOR] Move to {angle:.2f}°")
-                    else:
-                        motor.move_to(angle)
-                        print(f"Current Position: {motor.get_position():.2f}°")
+                    log.debug("Target Angle: %.2f°", angle)
+                    post_latest(mailbox, angle)
                 
                 # Send to web server
-                try:
-                    requests.post('http://localhost:5000/api/xplane', json={'field_name': 'sim/flightmodel/position/indicated_airspeed', 'value': airspeed}, timeout=1)
-                except Exception as e:
-                    print(f"Failed to send to web server: {e}")
+                post_webserver('/api/xplane', {'field_name': 'sim/flightmodel/position/indicated_airspeed', 'value': airspeed})
             else:
                 # Fallback for non-DREF messages
-                data_stripped = data.rstrip(b'\x00')
-                print("Message Type: Unknown")
-                print(f"Size: {len(data)} bytes")
-            print()
+                log.debug("--- Packet #%d from %s: Unknown, %d bytes", packet_num, addr, len(data))
             
     except KeyboardInterrupt:
-        print("\nStopped listening.")
+        log.info("\nStopped listening.")
     finally:
+        post_latest(mailbox, None)
+        worker.join()
         motor.move_to(0)
         motor.cleanup()
         sock.close()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG if os.environ.get('SIXPACK_DEBUG') == '1' else logging.INFO,
+                        format='%(message)s')
     capture_xplane_data()
@@ -1,9 +1,34 @@
 #!/usr/bin/env python3
 import socket
+import heapq
+import selectors
+import os
 import time
 import struct
 import json
-from threading import Thread
+import logging
+import logging.handlers
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock, Thread
+from dref_parse import parse_dref
+from udp_batch import MSG_DONTWAIT, BatchReceiver, send_batch
+
+try:
+    import requests
+except ImportError:
+    requests = None  # Web server notifications are optional
+
+try:
+    import orjson
+    json_dumps, json_loads = orjson.dumps, orjson.loads
+except ImportError:
+    # orjson is optional; stdlib json produces the same compact output, just slower
+    def json_dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode()
+    json_loads = json.loads
+
+log = logging.getLogger('rpi_hub')
 
 HEARTBEAT_PORT = 49002
 COMMAND_PORT = 49003
@@ -12,301 +37,519 @@ XPLANE_IP = '192.168.5.57'  # X-Plane host IP
 XPLANE_SEND_PORT = 49000  # Port for sending commands to X-Plane
 ENCODER_PORT = 49004  # New: Inputs ESP sends encoder events here
 TIMEOUT = 30  # Increased from 15 to 30 seconds
+LOOP_CPU = 2  # Core the event loop and its sockets' packet processing are pinned to (core 0 is left for the NIC interrupt)
+SO_INCOMING_CPU = getattr(socket, 'SO_INCOMING_CPU', 49)  # Linux-only option
+SAVE_INTERVAL = 5  # Minimum seconds between esp_devices.json rewrites
+COALESCE_INTERVAL = 0.05  # Motor values are held this long so only the newest per motor is sent
+RCVBUF_SIZE = 12 * 1024 * 1024  # Kernel receive buffer per socket (needs net.core.rmem_max >= this)
 DEVICES_FILE = 'esp_devices.json'
 CALIBRATION_FILE = 'calibration.json'
 MAPPING_FILE = 'instrument_mapping.json'
 
+# One non-blocking UDP socket shared by every outgoing datagram, ESP commands
+# and X-Plane DREFs alike (UDP is connectionless)
+_SEND_SOCK = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+_SEND_SOCK.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+_SEND_SOCK.setblocking(False)
+_xplane_sock = None  # Connected to XPLANE_IP:XPLANE_SEND_PORT on first use
+
+# Keep-alive HTTP session for web_server notifications. Posts run on a single
+# background worker so a slow web_server never stalls a UDP listener; when too
+# many are pending new ones are dropped (the counters they feed are cosmetic)
+_HTTP = None
+if requests:
+    _HTTP = requests.Session()
+    _HTTP.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+_NOTIFY_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notify')
+_notify_slots = BoundedSemaphore(64)
+
+# Copy-on-write: esp_devices is never modified in place, writers build a new
+# dict and swap it in, so any reference a reader holds is a consistent snapshot
 esp_devices = {}
+_devices_lock = Lock()  # Serializes writers
+_devices_dirty = False  # esp_devices changed since last save
+_last_save = 0.0
+_saved_keys = frozenset()  # Device ids in the last snapshot handed to the writer
+_save_queue = queue.Queue()  # esp_devices snapshots for device_writer; None stops it
+_expiry = []  # Heap of (expires_at, esp_id, last_seen), one entry per heartbeat
 instrument_mapping = {}
-xplane_bug_heading = {}  # Shared between xplane_listener and encoder_listener
+xplane_bug_heading = {}  # Shared between the X-Plane and encoder handlers
+
+# X-Plane handler state
+last_values = {}
+_pending = {}  # (esp_id, motor_id) -> newest motor value not yet sent
+_last_flush = 0.0
+last_logged_dref = {}
+motor_accumulator = {}
+
+# Encoder handler state: last raw encoder positions
+encoder_last_raw = {}
+
+# dref -> list of (instrument_name, esp_id, motor_id, key, unit, drefs, dref_count)
+# drefs is the tuple of summed DREFs for multi-DREF motors, None for single-DREF motors
+DREF_INDEX = {}
+# encoder name -> (dref, type, dref_bytes) for the ESP_Inputs encoders; dref_bytes
+# is the pre-encoded DREF packet path field (None when the encoder has no dref)
+ENCODER_INDEX = {}
+_DREF_VALUE = struct.Struct('<f')
+
+def build_dref_index(mapping):
+    """Flatten instruments -> motors -> drefs into a single dref lookup table"""
+    index = {}
+    for instrument_name, config in mapping.get('instruments', {}).items():
+        esp_id = config.get('esp_id')
+        unit = config.get('unit', '')
+        matched = set()  # First matching motor wins within an instrument
+        for mid, motor_config in config.get('motors', {}).items():
+            multi = motor_config.get('drefs')
+            drefs = tuple(multi) if multi else (motor_config.get('dref'),)
+            motor_id = int(mid)
+            entry = (instrument_name, esp_id, motor_id, f"{esp_id}:{motor_id}", unit,
+                     drefs if multi else None, len(drefs))
+            for dref in drefs:
+                if dref is None or dref in matched:
+                    continue
+                matched.add(dref)
+                index.setdefault(dref, []).append(entry)
+    return index
+
+def build_encoder_index(mapping):
+    """Flatten the ESP_Inputs encoder configs, pre-encoding each DREF path"""
+    index = {}
+    encoders = mapping.get('instruments', {}).get('ESP_Inputs', {}).get('encoders', {})
+    for name, config in encoders.items():
+        dref = config.get('dref')
+        index[name] = (dref, config.get('type', 'relative'), encode_dref_path(dref) if dref else None)
+    return index
 
 def load_instrument_mapping():
     """Load instrument mapping configuration"""
-    global instrument_mapping
+    global instrument_mapping, DREF_INDEX, ENCODER_INDEX
     try:
-        with open(MAPPING_FILE, 'r') as f:
-            instrument_mapping = json.load(f)
-            print(f"✓ Loaded instrument mapping with {len(instrument_mapping.get('instruments', {}))} instruments")
+        with open(MAPPING_FILE, 'rb') as f:
+            instrument_mapping = json_loads(f.read())
+            DREF_INDEX = build_dref_index(instrument_mapping)
+            ENCODER_INDEX = build_encoder_index(instrument_mapping)
+            log.info("✓ Loaded instrument mapping with %d instruments", len(instrument_mapping.get('instruments', {})))
     except FileNotFoundError:
-        print(f"✗ No mapping file found: {MAPPING_FILE}")
+        log.warning("✗ No mapping file found: %s", MAPPING_FILE)
     except Exception as e:
-        print(f"✗ Error loading mapping: {e}")
+        log.error("✗ Error loading mapping: %s", e)
 
-def save_devices():
+def write_devices(devices):
+    """Write a devices snapshot to disk atomically (temp file + rename)"""
+    tmp_file = DEVICES_FILE + '.tmp'
     try:
-        with open(DEVICES_FILE, 'w') as f:
-            json.dump(esp_devices, f, indent=2)
-        print(f"[SAVE] Devices saved: {list(esp_devices.keys())}")
+        with open(tmp_file, 'wb') as f:
+            f.write(json_dumps(devices))
+        os.replace(tmp_file, DEVICES_FILE)
+        log.debug("[SAVE] Devices saved: %s", list(devices))
     except Exception as e:
-        print(f"[ERROR] Failed to save devices: {e}")
+        log.error("[ERROR] Failed to save devices: %s", e)
 
-def parse_dref_message(data):
-    """Parse X-Plane DREF message"""
-    data_stripped = data.rstrip(b'\x00')
-    if len(data_stripped) < 9 or data_stripped[:5] != b'DREF+':
-        return None
-    try:
-        value = struct.unpack('<f', data_stripped[5:9])[0]
-        field = data_stripped[9:].decode('ascii', errors='replace')
-        return {'value': value, 'field': field}
-    except:
-        return None
+def device_writer():
+    """Write snapshots from _save_queue, skipping any superseded by a newer one"""
+    stop = False
+    while not stop:
+        snapshot = None
+        item = _save_queue.get()
+        while True:
+            if item is None:
+                stop = True
+            else:
+                snapshot = item
+            try:
+                item = _save_queue.get_nowait()
+            except queue.Empty:
+                break
+        if snapshot is not None:
+            write_devices(snapshot)
 
-def send_dref_to_xplane(dataref_path, value, xplane_ip='127.0.0.1', xplane_port=49000):
-    """Send DREF command to X-Plane"""
-    message = b'DREF\x00' + struct.pack('<f', float(value)) + dataref_path.encode('utf-8') + b'\x00'
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.sendto(message, (xplane_ip, xplane_port))
-    sock.close()
-    print(f"→ X-Plane: {dataref_path} = {value}")
+def save_devices():
+    """Hand the current esp_devices snapshot to the writer thread"""
+    global _devices_dirty, _last_save, _saved_keys
+    devices = esp_devices
+    _save_queue.put(devices)
+    _devices_dirty = False
+    _last_save = time.time()
+    _saved_keys = frozenset(devices)
+
+def mark_devices_dirty():
+    """Flag esp_devices as changed; saves right away if a device came or went, else at most every SAVE_INTERVAL seconds"""
+    global _devices_dirty
+    _devices_dirty = True
+    if time.time() - _last_save > SAVE_INTERVAL or esp_devices.keys() != _saved_keys:
+        save_devices()
 
-def heartbeat_listener():
+def open_listener(port, reuse=False):
+    """Bind a UDP socket on port with an enlarged receive buffer"""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind(('', HEARTBEAT_PORT))
-    print(f"Listening for heartbeats on port {HEARTBEAT_PORT}")
-    
-    while True:
-        try:
-            data, addr = sock.recvfrom(1024)
-            msg = data.decode()
-            if msg.startswith("HEARTBEAT:"):
-                parts = msg.split(":")
-                if len(parts) >= 2:
-                    esp_id = parts[1]
-                    uptime = parts[2] if len(parts) > 2 else "?"
-                    esp_devices[esp_id] = {'ip': addr[0], 'last_seen': time.time(), 'uptime': uptime}
-                    print(f"[HEARTBEAT] {esp_id} from {addr[0]} (uptime: {uptime}s)")
-                    save_devices()
-                else:
-                    print(f"[ERROR] Malformed heartbeat: {msg}")
-        except Exception as e:
-            print(f"[ERROR] Heartbeat listener: {e}")
+    if reuse:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('', port))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF_SIZE)
+    sock.setblocking(False)
+    return sock
 
-def check_offline():
-    while True:
-        time.sleep(5)
-        now = time.time()
-        offline_devices = []
-        for esp_id in list(esp_devices.keys()):
-            if now - esp_devices[esp_id]['last_seen'] > TIMEOUT:
-                offline_devices.append(esp_id)
-        
-        for esp_id in offline_devices:
-            if esp_id in esp_devices:  # Double-check device still exists
-                print(f"[OFFLINE] {esp_id}")
-                del esp_devices[esp_id]
+def pin_event_loop(socks, cpu=LOOP_CPU):
+    """Pin the calling thread and the listeners' packet processing to one CPU"""
+    if not hasattr(os, 'sched_setaffinity') or cpu not in os.sched_getaffinity(0):
+        return
+    try:
+        os.sched_setaffinity(0, {cpu})  # 0 = calling thread
+        for sock in socks:
+            sock.setsockopt(socket.SOL_SOCKET, SO_INCOMING_CPU, cpu)
+        log.info("[CPU] Event loop pinned to CPU %d", cpu)
+    except OSError as e:
+        log.warning("[WARN] Could not pin event loop to CPU %d: %s", cpu, e)
+
+def xplane_sock():
+    """Return a UDP socket connected to X-Plane, so the kernel resolves its route once"""
+    global _xplane_sock
+    if _xplane_sock is None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sock.connect((XPLANE_IP, XPLANE_SEND_PORT))
+        _xplane_sock = sock
+    return _xplane_sock
+
+def encode_dref_path(dataref_path):
+    """Return the 500-byte path field of an X-Plane DREF packet (null-terminated, then space-padded)"""
+    return (dataref_path.encode('utf-8') + b'\x00').ljust(500, b' ')
+
+def send_dref_to_xplane(dataref_path, value, xplane_ip=XPLANE_IP, xplane_port=XPLANE_SEND_PORT, dref_bytes=None):
+    """Send DREF command to X-Plane; dref_bytes is dataref_path already passed through encode_dref_path"""
+    # DREF format: "DREF\0" (5 bytes) + float (4 bytes) + dref_path (500 bytes)
+    # Total: 509 bytes
+    if dref_bytes is None:
+        dref_bytes = encode_dref_path(dataref_path)
+    message = b'DREF\x00' + _DREF_VALUE.pack(value) + dref_bytes
+    try:
+        if (xplane_ip, xplane_port) == (XPLANE_IP, XPLANE_SEND_PORT):
+            xplane_sock().send(message)
+        else:
+            _SEND_SOCK.sendto(message, (xplane_ip, xplane_port))
+    except BlockingIOError:
+        log.warning("[WARN] Send buffer full, dropped DREF %s", dataref_path)
+        return
+    log.debug("→ X-Plane: %s = %s", dataref_path, value)
+
+def handle_heartbeat(data, addr):
+    """Record a HEARTBEAT:<esp_id>:<uptime> datagram"""
+    try:
+        if data.startswith(b"HEARTBEAT:"):
+            parts = data[10:].split(b":", 2)
+            if parts[0]:
+                esp_id = parts[0].decode('ascii')
+                uptime = parts[1].decode('ascii') if len(parts) > 1 else "?"
+                last_seen = time.time()
+                set_device(esp_id, {'ip': addr[0], 'last_seen': last_seen, 'uptime': uptime})
+                heapq.heappush(_expiry, (last_seen + TIMEOUT, esp_id, last_seen))
+                log.debug("[HEARTBEAT] %s from %s (uptime: %ss)", esp_id, addr[0], uptime)
+                mark_devices_dirty()
+            else:
+                log.warning("[ERROR] Malformed heartbeat: %s", data)
+    except Exception as e:
+        log.error("[ERROR] Heartbeat listener: %s", e)
+
+def set_device(esp_id, info):
+    """Swap in a copy of esp_devices with esp_id set to info"""
+    global esp_devices
+    with _devices_lock:
+        devices = dict(esp_devices)
+        devices[esp_id] = info
+        esp_devices = devices
+
+def remove_devices(esp_ids):
+    """Swap in a copy of esp_devices without esp_ids"""
+    global esp_devices
+    with _devices_lock:
+        esp_devices = {k: v for k, v in esp_devices.items() if k not in esp_ids}
+
+def check_offline(now):
+    """Drop devices whose last heartbeat is older than TIMEOUT; return seconds until the next check is due"""
+    devices = esp_devices
+    expired = set()
+    while _expiry and _expiry[0][0] <= now:
+        _, esp_id, last_seen = heapq.heappop(_expiry)
+        device = devices.get(esp_id)
+        # Stale entry unless no newer heartbeat has arrived since
+        if device and device['last_seen'] == last_seen:
+            log.info("[OFFLINE] %s", esp_id)
+            expired.add(esp_id)
+    if expired:
+        remove_devices(expired)
+        mark_devices_dirty()
+    timeout = _expiry[0][0] - now if _expiry else TIMEOUT
+    
+    # Flush heartbeats that arrived inside the last save interval
+    if _devices_dirty:
+        flush_at = _last_save + SAVE_INTERVAL
+        if now >= flush_at:
+            save_devices()
+        else:
+            timeout = min(timeout, flush_at - now)
+    return timeout
 
 def send_command(esp_id, message):
-    if esp_id in esp_devices:
-        ip = esp_devices[esp_id]['ip']
+    """Send an already-encoded command datagram to an online ESP"""
+    device = esp_devices.get(esp_id)
+    if device:
+        ip = device['ip']
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.sendto(message.encode(), (ip, COMMAND_PORT))
-            print(f"→ {esp_id}: {message}")
-            sock.close()  # Close socket immediately after sending
+            _SEND_SOCK.sendto(message, (ip, COMMAND_PORT))
+            log.debug("→ %s: %s", esp_id, message)
+        except BlockingIOError:
+            log.warning("[WARN] Send buffer full, dropped %s: %s", esp_id, message)
         except Exception as e:
-            print(f"Send error: {e}")
+            log.error("Send error: %s", e)
     else:
-        print(f"✗ {esp_id} offline")
+        log.debug("✗ %s offline", esp_id)
+
+def queue_value(esp_id, motor_id, value):
+    """Hold a motor value until the next flush; a newer value for the same motor replaces it"""
+    _pending[(esp_id, motor_id)] = value
+
+def flush_pending(now):
+    """Send held motor values at most once per COALESCE_INTERVAL; return seconds until the next flush, or None"""
+    global _last_flush
+    if not _pending:
+        return None
+    wait = _last_flush + COALESCE_INTERVAL - now
+    if wait > 0:
+        return wait
+    # All held values go out in one sendmmsg call (e.g. both gyrocompass motors)
+    devices = esp_devices
+    messages = []
+    for (esp_id, motor_id), value in _pending.items():
+        device = devices.get(esp_id)
+        if device:
+            messages.append((b"VALUE:%d:%d" % (motor_id, value), (device['ip'], COMMAND_PORT)))
+        else:
+            log.debug("✗ %s offline", esp_id)
+    _pending.clear()
+    _last_flush = now
+    try:
+        sent = send_batch(_SEND_SOCK, messages)
+    except Exception as e:
+        log.error("Send error: %s", e)
+        return None
+    if sent < len(messages):
+        log.warning("[WARN] Send buffer full, dropped %d commands", len(messages) - sent)
+    if log.isEnabledFor(logging.DEBUG):
+        for message, (ip, _) in messages[:sent]:
+            log.debug("→ %s: %s", ip, message)
+    return None
+
+def _notify_done(future):
+    _notify_slots.release()
+    e = future.exception()
+    if e:
+        log.debug("Failed to notify web_server: %s", e)
+
+def post_webserver(path, payload, timeout=1):
+    """Queue a POST to web_server without waiting for the response"""
+    if _HTTP is None or not _notify_slots.acquire(blocking=False):
+        return
+    future = _NOTIFY_POOL.submit(_HTTP.post, 'http://localhost:5000' + path, json=payload, timeout=timeout)
+    future.add_done_callback(_notify_done)
 
 def notify_webserver_xplane(field_name, value, esp_id, motor_id=0):
     """Notify web_server about X-Plane message for counter updates"""
+    # Errors are dropped silently if web_server is not available
+    post_webserver('/api/xplane', {'field_name': field_name, 'value': value, 'esp_id': esp_id, 'motor_id': motor_id})
+
+def handle_xplane(data, addr):
+    """Forward a DREF+ datagram from X-Plane to the motors it drives"""
     try:
-        import requests
-        requests.post('http://localhost:5000/api/xplane', 
-                     json={'field_name': field_name, 'value': value, 'esp_id': esp_id, 'motor_id': motor_id},
-                     timeout=1)
+        parsed = parse_dref(data)
+        if parsed:
+            field, value = parsed
+            value = int(value)
+
+            # Update global bug heading if this is the heading bug dataref
+            if field == 'sim/cockpit2/autopilot/heading_dial_deg_mag_pilot':
+                xplane_bug_heading['EC11_HdgBug'] = value
+
+            # Log DREF (once per unique field to reduce spam)
+            if field not in last_logged_dref:
+                log.info("[DREF] Received: %s = %s", field, value)
+                last_logged_dref[field] = True
+
+            # Find motors driven by this DREF
+            entries = DREF_INDEX.get(field)
+            if entries is None:
+                return
+
+            for instrument_name, esp_id, motor_id, key, unit, drefs, dref_count in entries:
+                # If motor has multiple DREFs, accumulate them
+                if drefs:
+                    acc = motor_accumulator.get(key)
+                    if acc is None:
+                        acc = motor_accumulator[key] = {'sum': 0, 'drefs': {}}
+                    acc_drefs = acc['drefs']
+
+                    # Running sum: replace this DREF's previous contribution
+                    acc['sum'] += value - acc_drefs.get(field, 0)
+                    acc_drefs[field] = value
+
+                    # Only send when all DREFs have been received at least once
+                    if len(acc_drefs) == dref_count:
+                        combined_value = acc['sum']
+
+                        # Ignore values outside 0-360
+                        if not (0 <= combined_value <= 360):
+                            continue
+
+                        # First complete sum always, then only changes of more than 1
+                        last_val = last_values.get(key)
+                        if last_val is None or abs(combined_value - last_val) > 1:
+                            if log.isEnabledFor(logging.DEBUG):
+                                log.debug("[X-Plane] %s: %s %s (Motor %d) [sum of %s]", instrument_name, combined_value, unit, motor_id, list(drefs))
+                            queue_value(esp_id, motor_id, combined_value)
+                            notify_webserver_xplane(field, combined_value, esp_id, motor_id)
+                            last_values[key] = combined_value
+                else:
+                    # Single DREF - send directly
+                    final_value = value
+
+                    # Filter: Ignore airspeed values > 200 knots
+                    if esp_id == 'ESP_Airspeed' and value > 200:
+                        continue
+
+                    # Gyrocompass only: Ignore values outside 0-360
+                    if esp_id == 'ESP_Gyrocompass' and not (0 <= final_value <= 360):
+                        continue
+
+                    # Send to motor (first value always, then only changes of more than 1)
+                    last_val = last_values.get(key)
+                    if last_val is None or abs(final_value - last_val) > 1:
+                        log.debug("[X-Plane] %s: %s %s (Motor %d)", instrument_name, final_value, unit, motor_id)
+                        queue_value(esp_id, motor_id, final_value)
+                        notify_webserver_xplane(field, final_value, esp_id, motor_id)
+                        last_values[key] = final_value
     except Exception as e:
-        pass  # Silently fail if web_server not available
+        log.error("X-Plane error: %s", e)
 
-def xplane_listener():
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    sock.bind(('', XPLANE_PORT))
-    print(f"Listening for X-Plane on port {XPLANE_PORT}")
-    
-    last_values = {}
-    last_logged_dref = {}
-    motor_accumulator = {}
-    
-    while True:
-        try:
-            data, _ = sock.recvfrom(4096)
-            parsed = parse_dref_message(data)
-            if parsed:
-                field = parsed['field']
-                value = int(parsed['value'])
-                
-                # Update global bug heading if this is the heading bug dataref
-                if field == 'sim/cockpit2/autopilot/heading_dial_deg_mag_pilot':
-                    xplane_bug_heading['EC11_HdgBug'] = value
-                
-                # Log DREF (once per unique field to reduce spam)
-                if field not in last_logged_dref:
-                    print(f"[DREF] Received: {field} = {value}")
-                    last_logged_dref[field] = True
-                
-                # Find instrument by DREF
-                for instrument_name, config in instrument_mapping.get('instruments', {}).items():
-                    motors = config.get('motors', {})
-                    for mid, motor_config in motors.items():
-                        # Check single dref or array of drefs
-                        drefs_to_check = motor_config.get('drefs', [motor_config.get('dref')]) if motor_config.get('drefs') else [motor_config.get('dref')]
-                        if field in drefs_to_check:
-                            esp_id = config.get('esp_id')
-                            motor_id = int(mid)
-                            
-                            key = f"{esp_id}:{motor_id}"
-                            
-                            # If motor has multiple DREFs, accumulate them
-                            if motor_config.get('drefs'):
-                                if key not in motor_accumulator:
-                                    motor_accumulator[key] = {'sum': 0, 'drefs': {}}
-                                
-                                motor_accumulator[key]['drefs'][field] = value
-                                motor_accumulator[key]['sum'] = sum(motor_accumulator[key]['drefs'].values())
-                                
-                                # Only send when all DREFs have been received at least once
-                                if len(motor_accumulator[key]['drefs']) == len(drefs_to_check):
-                                    combined_value = motor_accumulator[key]['sum']
-                                    
-                                    # Ignore values outside 0-360
-                                    if not (0 <= combined_value <= 360):
-                                        continue
-                                    
-                                    last_val = last_values.get(key, combined_value)
-                                    if abs(combined_value - last_val) > 1:
-                                        print(f"[X-Plane] {instrument_name}: {combined_value} {config.get('unit', '')} (Motor {motor_id}) [sum of {list(motor_accumulator[key]['drefs'].keys())}]")
-                                        send_command(esp_id, f"VALUE:{motor_id}:{combined_value}")
-                                        notify_webserver_xplane(field, combined_value, esp_id, motor_id)
-                                        last_values[key] = combined_value
-                            else:
-                                # Single DREF - send directly
-                                final_value = value
-                                
-                                # Filter: Ignore airspeed values > 200 knots
-                                if esp_id == 'ESP_Airspeed' and value > 200:
-                                    continue
-                                
-                                # Gyrocompass only: Ignore values outside 0-360
-                                if esp_id == 'ESP_Gyrocompass' and not (0 <= final_value <= 360):
-                                    continue
-                                
-                                # Send to motor
-                                if key not in last_values:
-                                    # First time - always send
-                                    print(f"[X-Plane] {instrument_name}: {final_value} {config.get('unit', '')} (Motor {motor_id})")
-                                    send_command(esp_id, f"VALUE:{motor_id}:{final_value}")
-                                    notify_webserver_xplane(field, final_value, esp_id, motor_id)
-                                    last_values[key] = final_value
-                                else:
-                                    last_val = last_values[key]
-                                    if abs(final_value - last_val) > 1:
-                                        print(f"[X-Plane] {instrument_name}: {final_value} {config.get('unit', '')} (Motor {motor_id})")
-                                        send_command(esp_id, f"VALUE:{motor_id}:{final_value}")
-                                        notify_webserver_xplane(field, final_value, esp_id, motor_id)
-                                        last_values[key] = final_value
-                            break
-        except Exception as e:
-            print(f"X-Plane error: {e}")
+def handle_encoder(data, addr):
+    """Handle an ENCODER:<name>:<value>:<button> event from the Inputs ESP"""
+    try:
+        log.debug("Received raw message: %s", data)
 
-def encoder_listener():
-    """Listen for encoder events from Inputs ESP"""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind(('', ENCODER_PORT))
-    print(f"Listening for encoder events on port {ENCODER_PORT}")
-    
-    # Track last raw encoder positions
-    encoder_last_raw = {}
+        if data.startswith(b"ENCODER:"):
+            parts = data[8:].split(b":", 3)
+            if len(parts) >= 3:
+                encoder_name = parts[0].decode('ascii')
+                value = int(parts[1])
+                button = parts[2].decode('ascii')
+
+                log.debug("[ENCODER] %s: value=%d, btn=%s", encoder_name, value, button)
+
+                # Look up encoder configuration
+                encoder_config = ENCODER_INDEX.get(encoder_name)
+
+                if encoder_config:
+                    dref_path, encoder_type, dref_bytes = encoder_config
+
+                    if encoder_type == 'relative':
+                        # Calculate delta from last raw value
+                        if encoder_name in encoder_last_raw:
+                            delta = value - encoder_last_raw[encoder_name]
+                        else:
+                            delta = 0  # First reading, no delta
+
+                        encoder_last_raw[encoder_name] = value
+
+                        if delta != 0:
+                            # Get current bug heading from X-Plane data
+                            if encoder_name not in xplane_bug_heading:
+                                xplane_bug_heading[encoder_name] = 0  # Default if not yet received
+
+                            # Add delta to current heading
+                            # Python's % is already non-negative for a positive modulus
+                            new_value = (xplane_bug_heading[encoder_name] + delta) % 360
+
+                            xplane_bug_heading[encoder_name] = new_value
+                            log.debug("[%s] Delta=%d, New heading=%d°", encoder_name, delta, new_value)
+
+                            # Send to X-Plane via UDP
+                            try:
+                                send_dref_to_xplane(dref_path, new_value, dref_bytes=dref_bytes)
+                                log.debug("[X-PLANE] Sent %s: %d° to %s", encoder_name, new_value, dref_path)
+                            except Exception as e:
+                                log.error("[ERROR] Failed to send to X-Plane: %s", e)
+
+                # Notify web_server for UI updates (queued, so a slow server never stalls the loop)
+                payload = {'encoder': encoder_name, 'value': value, 'button': button}
+                log.debug("Sending to web_server: %s", payload)
+                post_webserver('/api/encoder_event', payload, timeout=2)
+        else:
+            log.warning("[ERROR] Unknown encoder message format: %s", data)
+    except Exception as e:
+        log.error("Encoder listener error: %s", e)
+
+def run():
+    """Serve every listener socket from one selector loop on the calling thread"""
+    sel = selectors.DefaultSelector()
+    socks = []
+    for port, handler, reuse, name in ((HEARTBEAT_PORT, handle_heartbeat, False, 'heartbeats'),
+                                       (XPLANE_PORT, handle_xplane, True, 'X-Plane'),
+                                       (ENCODER_PORT, handle_encoder, False, 'encoder events')):
+        sock = open_listener(port, reuse)
+        sel.register(sock, selectors.EVENT_READ, (BatchReceiver(sock), handler))
+        socks.append(sock)
+        log.info("Listening for %s on port %d", name, port)
+    pin_event_loop(socks)
+    log.info("Ready. Press Ctrl+C to stop\n")
     
+    # Offline expiry, deferred saves and held motor values are handled between
+    # reads; the loop wakes no later than the next of them is due
+    timeout = check_offline(time.time())
     while True:
-        try:
-            data, addr = sock.recvfrom(1024)
-            msg = data.decode()
-            print(f"[DEBUG] Received raw message: {msg}")  # Debug
-            
-            if msg.startswith("ENCODER:"):
-                parts = msg.split(":")
-                if len(parts) >= 4:
-                    encoder_name = parts[1]
-                    value = int(parts[2])
-                    button = parts[3]
-                    
-                    print(f"[ENCODER] {encoder_name}: value={value}, btn={button}")
-                    
-                    # Look up encoder configuration
-                    inputs_config = instrument_mapping.get('instruments', {}).get('ESP_Inputs', {})
-                    encoders = inputs_config.get('encoders', {})
-                    encoder_config = encoders.get(encoder_name)
-                    
-                    if encoder_config:
-                        dref_path = encoder_config.get('dref')
-                        encoder_type = encoder_config.get('type', 'relative')
-                        
-                        if encoder_type == 'relative':
-                            # Calculate delta from last raw value
-                            if encoder_name in encoder_last_raw:
-                                delta = value - encoder_last_raw[encoder_name]
-                            else:
-                                delta = 0  # First reading, no delta
-                            
-                            encoder_last_raw[encoder_name] = value
-                            
-                            if delta != 0:
-                                # Get current bug heading from X-Plane data
-                                if encoder_name not in xplane_bug_heading:
-                                    xplane_bug_heading[encoder_name] = 0  # Default if not yet received
-                                
-                                # Add delta to current heading
-                                new_value = (xplane_bug_heading[encoder_name] + delta) % 360
-                                if new_value < 0:
-                                    new_value += 360
-                                
-                                xplane_bug_heading[encoder_name] = new_value
-                                print(f"[{encoder_name}] Delta={delta}, New heading={new_value}°")
-                                
-                                # Send to X-Plane via UDP
-                                try:
-                                    xplane_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                                    import struct
-                                    # DREF format: "DREF\0" (5 bytes) + float (4 bytes) + dref_path (500 bytes, null-terminated then space-padded)
-                                    # Total: 509 bytes
-                                    dref_bytes = (dref_path.encode('utf-8') + b'\x00').ljust(500, b' ')
-                                    message = b"DREF\x00" + struct.pack('<f', float(new_value)) + dref_bytes
-                                    xplane_sock.sendto(message, (XPLANE_IP, XPLANE_SEND_PORT))
-                                    xplane_sock.close()
-                                    print(f"[X-PLANE] Sent {encoder_name}: {new_value}° to {dref_path}")
-                                except Exception as e:
-                                    print(f"[ERROR] Failed to send to X-Plane: {e}")
-                    
-                    # Notify web_server for UI updates
-                    try:
-                        import requests
-                        payload = {'encoder': encoder_name, 'value': value, 'button': button}
-                        print(f"[DEBUG] Sending to web_server: {payload}")  # Debug
-                        
-                        response = requests.post('http://localhost:5000/api/encoder_event',
-                                     json=payload,
-                                     timeout=2)
-                        print(f"[DEBUG] Web server response: {response.status_code}")  # Debug
-                    except Exception as e:
-                        print(f"[ERROR] Failed to notify web_server: {e}")
-            else:
-                print(f"[ERROR] Unknown encoder message format: {msg}")
-        except Exception as e:
-            print(f"Encoder listener error: {e}")
+        for key, _ in sel.select(timeout):
+            receiver, handler = key.data
+            # Drain everything queued on this socket before waiting again
+            while True:
+                try:
+                    batch = receiver.recv(MSG_DONTWAIT)
+                except Exception as e:
+                    log.error("[ERROR] %s: %s", handler.__name__, e)
+                    break
+                for data, addr in batch:
+                    handler(data, addr)
+                if len(batch) < receiver.batch_size:
+                    break
+        now = time.time()
+        timeout = check_offline(now)
+        wait = flush_pending(now)
+        if wait is not None:
+            timeout = min(timeout, wait)
+
+def setup_logging():
+    """Route log records through a queue so stdout writes happen on a listener thread, not the event loop"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, handler)
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(logging.DEBUG if os.environ.get('SIXPACK_DEBUG') == '1' else logging.INFO)
+    listener.start()
+    return listener
 
 if __name__ == "__main__":
-    print("=== RPi Hub ===")
+    log_listener = setup_logging()
+    log.info("=== RPi Hub ===")
     load_instrument_mapping()
-    Thread(target=heartbeat_listener, daemon=True).start()
-    Thread(target=check_offline, daemon=True).start()
-    Thread(target=xplane_listener, daemon=True).start()
-    Thread(target=encoder_listener, daemon=True).start()  # New
-    print("Ready. Press Ctrl+C to stop\n")
+    writer = Thread(target=device_writer, daemon=True)
+    writer.start()
     
     try:
-        while True:
-            time.sleep(1)
+        run()
     except KeyboardInterrupt:
-        print("\nShutdown")
+        if _devices_dirty:
+            save_devices()
+        _save_queue.put(None)
+        writer.join()
+        log.info("\nShutdown")
+        log_listener.stop()
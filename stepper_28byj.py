@@ -9,6 +9,7 @@ the Raspberry Pi (or other).
 import time
 import sys
 import os
+import mmap
 
 # Detect if running in Docker
 IN_DOCKER = os.path.exists('/.dockerenv')
@@ -16,6 +17,11 @@ IN_DOCKER = os.path.exists('/.dockerenv')
 if not IN_DOCKER:
     import RPi.GPIO as GPIO
 
+try:
+    import pigpio  # Optional: plays whole moves from the pigpiod DMA engine when the daemon is running
+except ImportError:
+    pigpio = None
+
 # GPIO Pins for 28BYJ-48 stepper motor
 IN1 = 17
 IN2 = 27
@@ -54,6 +60,39 @@ SEQUENCE_FULL = [  # 4-step full stepping
 CW = 1   # Clockwise
 CCW = -1 # Counterclockwise
 
+PINS = (IN1, IN2, IN3, IN4)
+ALL_PINS_MASK = sum(1 << pin for pin in PINS)
+WAVE_CHUNK = 2000  # Steps per pigpio waveform; keeps each wave well under pigpiod's pulse limit
+
+
+def _pack(sequence):
+    """Pack a coil sequence step into a 4-bit mask (bit 0 = IN1 ... bit 3 = IN4)"""
+    return sum(on << i for i, on in enumerate(sequence))
+
+
+MASKS_HALF = bytes(_pack(seq) for seq in SEQUENCE_HALF)
+MASKS_FULL = bytes(_pack(seq) for seq in SEQUENCE_FULL)
+
+# 4-bit coil mask -> GPIO register bit mask
+_GPIO_MASKS = tuple(sum(1 << pin for i, pin in enumerate(PINS) if m >> i & 1) for m in range(16))
+
+# BCM2835-family GPIO registers (32-bit word offsets into /dev/gpiomem)
+GPSET0 = 0x1C // 4
+GPCLR0 = 0x28 // 4
+
+
+def _open_gpiomem():
+    """Map the GPIO set/clear registers, or return None where they aren't available"""
+    try:
+        with open('/proc/device-tree/model', 'rb') as f:
+            if b'Raspberry Pi 5' in f.read():
+                return None  # Pi 5 GPIO lives on the RP1 chip with a different register map
+        with open('/dev/gpiomem', 'r+b') as f:
+            mem = mmap.mmap(f.fileno(), 4096, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+    except OSError:
+        return None
+    return memoryview(mem).cast('I')
+
 
 class Stepper28BYJ48:
     """Control class for 28BYJ-48 stepper motor"""
@@ -66,12 +105,24 @@ class Stepper28BYJ48:
             delay: Time (in seconds) between steps. Default 0.001 (1ms)
             resolution: Stepping resolution - 'full' or 'half' (default)
         """
-        # Initialize GPIO (skip in Docker)
-        if not IN_DOCKER:
+        self.pi = None
+        if pigpio is not None and not IN_DOCKER:
+            pi = pigpio.pi()
+            if pi.connected:
+                self.pi = pi
+                for pin in PINS:
+                    pi.set_mode(pin, pigpio.OUTPUT)
+                pi.clear_bank_1(ALL_PINS_MASK)
+
+        # Initialize GPIO (skip in Docker, or when pigpio drives the pins)
+        self._gpiomem = None
+        if not IN_DOCKER and self.pi is None:
             GPIO.setmode(GPIO.BCM)
             GPIO.setwarnings(False)
             GPIO.setup([IN1, IN2, IN3, IN4], GPIO.OUT)
             GPIO.output([IN1, IN2, IN3, IN4], GPIO.LOW)
+            # Pins are configured as outputs above; steps then go straight to the set/clear registers
+            self._gpiomem = _open_gpiomem()
 
         self.delay = delay
         self.resolution = resolution.lower()
@@ -80,17 +131,36 @@ class Stepper28BYJ48:
         
         self.steps_per_revolution = RESOLUTIONS[self.resolution]
         self.sequence = SEQUENCE_FULL if self.resolution == 'full' else SEQUENCE_HALF
+        self.masks = MASKS_FULL if self.resolution == 'full' else MASKS_HALF
         
         self.current_position = 0.0  # Current position in degrees
         self.sequence_index = 0      # Current position in coil sequence
+        self._last_mask = 0          # Coil mask last written by _set_coils_gpio
+
+        # Pick the coil writer once so the step loop doesn't re-check the backend every step
+        if self._gpiomem is not None:
+            self._set_coils = self._set_coils_gpiomem
+        elif IN_DOCKER:
+            self._set_coils = self._set_coils_none
+        else:
+            self._set_coils = self._set_coils_gpio
+
+    def _set_coils_gpiomem(self, mask):
+        """Activate coils according to a packed 4-bit coil mask via the GPIO registers"""
+        on = _GPIO_MASKS[mask]
+        self._gpiomem[GPSET0] = on
+        self._gpiomem[GPCLR0] = ALL_PINS_MASK & ~on
 
-    def _set_coils(self, sequence):
-        """Activate coils according to the given sequence"""
-        if not IN_DOCKER:
-            GPIO.output(IN1, sequence[0])
-            GPIO.output(IN2, sequence[1])
-            GPIO.output(IN3, sequence[2])
-            GPIO.output(IN4, sequence[3])
+    def _set_coils_gpio(self, mask):
+        """Activate coils according to a packed 4-bit coil mask via RPi.GPIO"""
+        # Half stepping changes one coil per step, so write only the pins that differ
+        changed = [i for i in range(4) if (mask ^ self._last_mask) >> i & 1]
+        if changed:
+            GPIO.output([PINS[i] for i in changed], [mask >> i & 1 for i in changed])
+        self._last_mask = mask
+
+    def _set_coils_none(self, mask):
+        """No GPIO in Docker; steps are only timed"""
 
     def rotate(self, direction, degrees):
         """
@@ -108,11 +178,21 @@ class Stepper28BYJ48:
 
         print(f"Rotating {degrees}° ({steps} steps, {self.resolution} step mode) {'CW' if direction == CW else 'CCW'}...")
 
-        for _ in range(steps):
-            # Move to next position in sequence
-            self.sequence_index = (self.sequence_index + step_direction) % len(self.sequence)
-            self._set_coils(self.sequence[self.sequence_index])
-            time.sleep(self.delay)
+        schedule = self._schedule(step_direction, steps)
+        if self.pi is not None:
+            self._rotate_wave(schedule)
+        else:
+            set_coils = self._set_coils
+            delay = self.delay
+            monotonic = time.monotonic
+            # Sleep to a running deadline so scheduler jitter doesn't accumulate across steps
+            deadline = monotonic()
+            for mask in schedule:
+                set_coils(mask)
+                deadline += delay
+                remaining = deadline - monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
 
         # Update position
         self.current_position += degrees if direction == CW else -degrees
@@ -120,6 +200,35 @@ class Stepper28BYJ48:
 
         print(f"Current position: {self.current_position:.2f}°")
 
+    def _schedule(self, step_direction, steps):
+        """Return the coil mask for each step of a move and advance sequence_index past it"""
+        masks = self.masks
+        n = len(masks)
+        idx = self.sequence_index
+        schedule = bytearray(steps)
+        for i in range(steps):
+            idx = (idx + step_direction) % n
+            schedule[i] = masks[idx]
+        self.sequence_index = idx
+        return schedule
+
+    def _rotate_wave(self, schedule):
+        """Play a step schedule as pigpio waveforms so step timing doesn't depend on Python"""
+        pi = self.pi
+        delay_us = max(1, int(self.delay * 1000000))
+        for start in range(0, len(schedule), WAVE_CHUNK):
+            pulses = []
+            for mask in schedule[start:start + WAVE_CHUNK]:
+                on_mask = _GPIO_MASKS[mask]
+                pulses.append(pigpio.pulse(on_mask, ALL_PINS_MASK & ~on_mask, delay_us))
+            pi.wave_clear()
+            pi.wave_add_generic(pulses)
+            wid = pi.wave_create()
+            pi.wave_send_once(wid)
+            while pi.wave_tx_busy():
+                time.sleep(0.001)
+            pi.wave_delete(wid)
+
     def move_to(self, target_degrees):
         """
         Move to an absolute position (in degrees from start).
@@ -151,13 +260,19 @@ class Stepper28BYJ48:
 
     def stop(self):
         """Stop the motor and release coils"""
-        if not IN_DOCKER:
+        if self.pi is not None:
+            self.pi.wave_tx_stop()
+            self.pi.clear_bank_1(ALL_PINS_MASK)
+        elif not IN_DOCKER:
             GPIO.output([IN1, IN2, IN3, IN4], GPIO.LOW)
+        self._last_mask = 0
 
     def cleanup(self):
         """Clean up GPIO resources"""
         self.stop()
-        if not IN_DOCKER:
+        if self.pi is not None:
+            self.pi.stop()
+        elif not IN_DOCKER:
             GPIO.cleanup()
 
     def get_position(self):
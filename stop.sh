@@ -1,4 +1,4 @@
 #!/bin/bash
-pkill -f "python3 web_server.py"
+pkill -f "web_server(.py|:app)"
 pkill -f "python3 rpi_hub.py"
 echo "Stopped web server and RPi hub"
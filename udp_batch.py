@@ -0,0 +1,177 @@
+"""
+Batched UDP receive and send for the RPi hub.
+
+recvmmsg(2) drains up to BATCH_SIZE queued datagrams in a single syscall and
+sendmmsg(2) sends a list of datagrams in one. CPython's socket module doesn't
+expose either, so they are called through ctypes (Linux/glibc). Elsewhere
+both fall back to one recvfrom/sendto per datagram.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+
+BATCH_SIZE = 32      # Datagrams per recvmmsg call
+BUFFER_SIZE = 2048   # Per-datagram buffer (X-Plane DREF packets are 509 bytes)
+
+MSG_DONTWAIT = 0x40
+MSG_WAITFORONE = 0x10000  # Block for the first datagram only, then drain what's queued
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+
+class sockaddr_in(ctypes.Structure):
+    _fields_ = [
+        ('sin_family', ctypes.c_ushort),
+        ('sin_port', ctypes.c_uint16),
+        ('sin_addr', ctypes.c_uint8 * 4),
+        ('sin_zero', ctypes.c_uint8 * 8),
+    ]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(iovec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', msghdr),
+        ('msg_len', ctypes.c_uint),
+    ]
+
+
+def _load_libc_fn(name, argtypes):
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fn = getattr(libc, name)
+    except (OSError, AttributeError):
+        return None
+    fn.argtypes = argtypes
+    fn.restype = ctypes.c_int
+    return fn
+
+
+_recvmmsg = _load_libc_fn('recvmmsg', [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p])
+_sendmmsg = _load_libc_fn('sendmmsg', [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int])
+
+
+class BatchReceiver:
+    """Receive UDP datagrams in batches using pre-allocated buffers"""
+
+    def __init__(self, sock, batch_size=BATCH_SIZE, buffer_size=BUFFER_SIZE):
+        self.sock = sock
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+
+        if _recvmmsg is None:
+            return
+
+        # Allocated once and reused for every call
+        self._buffers = [ctypes.create_string_buffer(buffer_size) for _ in range(batch_size)]
+        self._addrs = (sockaddr_in * batch_size)()
+        self._iovecs = (iovec * batch_size)()
+        self._msgs = (mmsghdr * batch_size)()
+        for i in range(batch_size):
+            self._iovecs[i].iov_base = ctypes.addressof(self._buffers[i])
+            self._iovecs[i].iov_len = buffer_size
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self._addrs[i])
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+
+    def recv(self, flags=MSG_WAITFORONE):
+        """Return a list of (data, addr) tuples; empty when a non-blocking read finds nothing queued"""
+        if _recvmmsg is None:
+            if not flags & MSG_DONTWAIT:
+                return [self.sock.recvfrom(self.buffer_size)]
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.sock.recvfrom(self.buffer_size, MSG_DONTWAIT))
+                except BlockingIOError:
+                    break
+            return batch
+
+        addr_size = ctypes.sizeof(sockaddr_in)
+        for i in range(self.batch_size):
+            self._msgs[i].msg_hdr.msg_namelen = addr_size
+
+        while True:
+            count = _recvmmsg(self.sock.fileno(), self._msgs, self.batch_size, flags, None)
+            if count >= 0:
+                break
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return []
+            raise OSError(err, os.strerror(err))
+
+        batch = []
+        for i in range(count):
+            sa = self._addrs[i]
+            addr = (socket.inet_ntoa(bytes(sa.sin_addr)), socket.ntohs(sa.sin_port))
+            data = ctypes.string_at(self._buffers[i], self._msgs[i].msg_len)
+            batch.append((data, addr))
+        return batch
+
+
+def send_batch(sock, messages):
+    """Send a list of (data, (ip, port)) datagrams; return how many were sent before the socket would block"""
+    if not messages:
+        return 0
+    if _sendmmsg is None:
+        sent = 0
+        for data, addr in messages:
+            try:
+                sock.sendto(data, addr)
+            except BlockingIOError:
+                break
+            sent += 1
+        return sent
+
+    count = len(messages)
+    buffers = [ctypes.create_string_buffer(data, len(data)) for data, _ in messages]
+    addrs = (sockaddr_in * count)()
+    iovecs = (iovec * count)()
+    msgs = (mmsghdr * count)()
+    for i, (data, (ip, port)) in enumerate(messages):
+        addrs[i].sin_family = socket.AF_INET
+        addrs[i].sin_port = socket.htons(port)
+        addrs[i].sin_addr[:] = socket.inet_aton(ip)
+        iovecs[i].iov_base = ctypes.addressof(buffers[i])
+        iovecs[i].iov_len = len(data)
+        hdr = msgs[i].msg_hdr
+        hdr.msg_name = ctypes.addressof(addrs[i])
+        hdr.msg_namelen = ctypes.sizeof(sockaddr_in)
+        hdr.msg_iov = ctypes.pointer(iovecs[i])
+        hdr.msg_iovlen = 1
+
+    sent = 0
+    while sent < count:
+        # sendmmsg may stop early; resume from the first unsent datagram
+        n = _sendmmsg(sock.fileno(), ctypes.addressof(msgs) + sent * ctypes.sizeof(mmsghdr), count - sent, 0)
+        if n > 0:
+            sent += n
+            continue
+        err = ctypes.get_errno()
+        if n < 0 and err == errno.EINTR:
+            continue
+        if n < 0 and err not in (errno.EAGAIN, errno.EWOULDBLOCK):
+            raise OSError(err, os.strerror(err))
+        break
+    return sent
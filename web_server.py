@@ -1,15 +1,53 @@
 #!/usr/bin/env python3
 import socket
+import bisect
+from array import array
 import json
 import time
 import os
+import atexit
+import functools
+import itertools
+import logging
+import logging.handlers
+import queue
 from datetime import datetime
-from threading import Thread
-from flask import Flask, render_template, jsonify, request
+from threading import Event, Lock, Thread
+from udp_batch import send_batch
+from flask import Flask, g, render_template, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from cachetools import TTLCache
+
+try:
+    import orjson
+    json_dumps, json_loads = orjson.dumps, orjson.loads
+    def dumps_calibrations(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    # orjson is optional; stdlib json writes the same file, just slower
+    orjson = None
+    def json_dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode()
+    json_loads = json.loads
+    def dumps_calibrations(obj):
+        return json.dumps(obj, indent=2).encode()
 
 app = Flask(__name__)
+log = logging.getLogger('web_server')
+
+if orjson is not None:
+    class ORJSONProvider(DefaultJSONProvider):
+        """Flask JSON provider backed by orjson for request bodies and jsonify"""
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = ORJSONProvider(app)
 
-DEBUG = True
+
+DEBUG = os.environ.get('SIXPACK_DEBUG') == '1'  # Same switch as rpi_hub's debug logging
 HEARTBEAT_PORT = 49002
 COMMAND_PORT = 49003
 TIMEOUT = 15
@@ -17,13 +55,39 @@ XPLANE_TIMEOUT = 5
 CAL_FILE = 'calibrations.json'
 DEVICES_FILE = 'esp_devices.json'
 MAPPING_FILE = 'instrument_mapping.json'
+FILE_RECHECK = 1.0  # Seconds between esp_devices.json / mapping checks on the X-Plane path
+SEND_WINDOW = 0.005  # Seconds udp_sender gathers commands before sending them in one batch
+SEND_BATCH = 100     # Most commands per sendmmsg batch
+VALUE_RESEND = 1.0  # Seconds before an unchanged X-Plane value is sent to its ESP again
+SAVE_DEBOUNCE = 0.2  # Minimum seconds between calibrations.json rewrites
+
+# ESP commands are queued by request threads and sent by udp_sender on its own socket
+_UDP_SOCK = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+_send_queue = queue.Queue(maxsize=1024)  # ((ip, port), message bytes)
+_flush_now = Event()  # Set by urgent commands to cut the batching window short
+
+# X-Plane values waiting for value_sender: (esp_id, motor_id, value)
+_value_queue = queue.Queue(maxsize=1024)
 
 esp_devices = {}
+_devices_stamp = None  # (mtime_ns, size) of DEVICES_FILE when esp_devices was last read
+_devices_checked = 0.0  # time.monotonic() of send_command's last devices check
+_mapping_checked = 0.0  # time.monotonic() of xplane_data's last mapping check
+_cal_stamp = None      # (mtime_ns, size) of CAL_FILE when calibrations was last read
 calibrations = {}
-xplane_counters = {}
+xplane_counters = {}  # X-Plane message counts for ESP ids outside INSTRUMENT_METADATA
 instrument_mapping = {}
-encoder_events = {}
-dref_data = {}
+_mapping_stamp = None  # (mtime_ns, size) of MAPPING_FILE when instrument_mapping was last read
+_dref_index = {}  # dref -> (esp_id, motor_id), rebuilt with instrument_mapping
+# Entries expire so long sessions don't keep every DREF/encoder ever seen; guarded by _live_lock
+encoder_events = TTLCache(maxsize=64, ttl=60)
+dref_data = TTLCache(maxsize=256, ttl=30)  # dref -> (value, timestamp)
+_live_lock = Lock()
+_state_version = 0  # Bumped whenever dashboard-visible state changes; feeds the polling ETags
+_state_versions = itertools.count(1)  # next() on a count is atomic, so concurrent bumps never share a value
+_ETAG_PREFIX = f'{time.time_ns():x}'  # Per-process, so tags from before a restart never match
+_json_bodies = {}  # endpoint name -> (state version, serialized body)
+_cal_dirty = Event()  # Set when calibrations has changes not yet written to CAL_FILE
 
 # Instrument metadata
 INSTRUMENT_METADATA = {
@@ -36,44 +100,252 @@ INSTRUMENT_METADATA = {
     'ESP_Inputs': {'motor_count': 0, 'type': 'inputs'},
 }
 
+# Dashboard row order, and the instruments that have no motors to move or zero
+INSTRUMENT_ORDER = (
+    'ESP_Airspeed',
+    'ESP_AttitudeIndicator',
+    'ESP_Altimeter',
+    'ESP_TurnIndicator',
+    'ESP_Gyrocompass',
+    'ESP_VertSpeed',
+    'ESP_Inputs',
+)
+# X-Plane message count per known instrument, indexed by _ESP_IDX
+_ESP_IDX = {esp_id: i for i, esp_id in enumerate(INSTRUMENT_METADATA)}
+_xplane_cnt = array('Q', [0] * len(_ESP_IDX))
+NO_MOTOR_ESPS = frozenset(esp_id for esp_id, meta in INSTRUMENT_METADATA.items() if meta['motor_count'] == 0)
+
+def setup_logging():
+    """Queue web_server log records so request threads never wait on stdout; a listener thread writes them"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, handler)
+    log.addHandler(logging.handlers.QueueHandler(records))
+    log.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+    log.propagate = False
+    listener.start()
+    return listener
+
+def file_changed(path, stamp):
+    """Return path's (mtime_ns, size) if it differs from stamp; None if unchanged or missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    new_stamp = (st.st_mtime_ns, st.st_size)
+    return new_stamp if new_stamp != stamp else None
+
 def load_devices():
-    global esp_devices
-    if os.path.exists(DEVICES_FILE):
-        try:
-            with open(DEVICES_FILE, 'r') as f:
-                esp_devices = json.load(f)
-        except Exception as e:
-            print(f"Error loading devices: {e}")
-            esp_devices = {}
+    """Reload esp_devices if rpi_hub has rewritten DEVICES_FILE since the last read"""
+    global esp_devices, _devices_stamp
+    stamp = file_changed(DEVICES_FILE, _devices_stamp)
+    if stamp is None:
+        return
+    try:
+        with open(DEVICES_FILE, 'rb') as f:
+            esp_devices = json_loads(f.read())
+        _devices_stamp = stamp
+        state_changed()
+    except Exception as e:
+        log.error("Error loading devices: %s", e)
+        esp_devices = {}
 
 def load_calibrations():
-    global calibrations
-    if os.path.exists(CAL_FILE):
-        with open(CAL_FILE, 'r') as f:
-            calibrations = json.load(f)
+    """Reload calibrations if CAL_FILE changed since the last read"""
+    global calibrations, _cal_stamp
+    stamp = file_changed(CAL_FILE, _cal_stamp)
+    if stamp is None:
+        return
+    with open(CAL_FILE, 'rb') as f:
+        calibrations = json_loads(f.read())
+    # The point routes keep points sorted by value; hand-edited files may not be
+    for esp_id, cal in calibrations.items():
+        points = cal.get('points') if isinstance(cal, dict) else None
+        if not isinstance(points, list):
+            continue
+        valid = [point for point in points if valid_point(point)]
+        if len(valid) != len(points):
+            log.warning("Skipping %d calibration point(s) without a numeric value for %s",
+                        len(points) - len(valid), esp_id)
+        cal['points'] = sorted(valid, key=_point_value)
+    _cal_stamp = stamp
 
 def load_instrument_mapping():
-    global instrument_mapping
-    if os.path.exists(MAPPING_FILE):
+    """Reload instrument_mapping and _dref_index if MAPPING_FILE changed since the last read"""
+    global instrument_mapping, _mapping_stamp, _dref_index
+    stamp = file_changed(MAPPING_FILE, _mapping_stamp)
+    if stamp is None:
+        return
+    try:
+        with open(MAPPING_FILE, 'rb') as f:
+            instrument_mapping = json_loads(f.read())
+    except Exception as e:
+        log.error("Error loading instrument mapping: %s", e)
+        instrument_mapping = {}
+    _mapping_stamp = stamp
+    _dref_index = build_dref_index(instrument_mapping)
+
+def build_dref_index(mapping):
+    """Map each motor's dref to (esp_id, motor_id); the first instrument listing a dref wins"""
+    index = {}
+    for config in mapping.get('instruments', {}).values():
+        for mid, motor_config in config.get('motors', {}).items():
+            dref = motor_config.get('dref')
+            if dref is not None and config.get('esp_id'):
+                index.setdefault(dref, (config['esp_id'], int(mid)))
+    return index
+
+def snapshot(ttl_cache):
+    """Return a plain dict of the unexpired entries in dref_data or encoder_events"""
+    with _live_lock, ttl_cache.timer:  # Freeze the clock so nothing expires mid-copy
+        return {k: ttl_cache[k] for k in ttl_cache}
+
+def state_changed():
+    """Bump the state version so the next dashboard poll gets a fresh ETag"""
+    global _state_version
+    _state_version = next(_state_versions)
+
+def expire_live():
+    """Drop expired dref_data/encoder_events entries, bumping the state version if any went"""
+    with _live_lock:
+        # expire() returns the evicted items from cachetools 5.5 on (hence the requirement)
+        expired = dref_data.expire()
+        expired += encoder_events.expire()
+    if expired:
+        state_changed()
+
+def conditional_json(name, build):
+    """Serve build() as JSON with an ETag; the serialized body is reused until the state version changes"""
+    # Payloads carry timestamps rather than elapsed times, so the tag only moves when state does.
+    # X-Server-Time lets the dashboard work out elapsed times without trusting its own clock.
+    expire_live()
+    version = _state_version
+    headers = {'ETag': f'W/"{_ETAG_PREFIX}-{version}"', 'X-Server-Time': f'{g.now:.3f}'}
+    if request.headers.get('If-None-Match') == headers['ETag']:
+        return '', 304, headers
+    cached_version, body = _json_bodies.get(name, (None, None))
+    if cached_version != version:
+        body = jsonify(build()).get_data()
+        _json_bodies[name] = (version, body)
+    return app.response_class(body, mimetype=app.json.mimetype, headers=headers)
+
+def write_calibrations():
+    """Write calibrations to CAL_FILE atomically (temp file + rename)"""
+    tmp_file = CAL_FILE + '.tmp'
+    try:
+        data = dumps_calibrations(calibrations)
+    except RuntimeError:
+        _cal_dirty.set()  # Changed mid-serialization by a request thread; retry next round
+        return
+    try:
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, CAL_FILE)
+    except Exception as e:
+        log.error("Error saving calibrations: %s", e)
+
+def calibration_writer():
+    """Write calibrations whenever they change, at most once per SAVE_DEBOUNCE seconds"""
+    while True:
+        _cal_dirty.wait()
+        _cal_dirty.clear()
         try:
-            with open(MAPPING_FILE, 'r') as f:
-                instrument_mapping = json.load(f)
-        except Exception as e:
-            print(f"Error loading instrument mapping: {e}")
-            instrument_mapping = {}
+            write_calibrations()
+        except Exception:
+            # Keep the thread alive; later saves still need writing
+            log.exception("Calibration writer failed")
+        time.sleep(SAVE_DEBOUNCE)
+
+def flush_calibrations():
+    """Write any calibration change still waiting on the writer thread"""
+    if _cal_dirty.is_set():
+        _cal_dirty.clear()
+        write_calibrations()
 
 def save_calibrations():
-    with open(CAL_FILE, 'w') as f:
-        json.dump(calibrations, f, indent=2)
+    """Mark calibrations changed; calibration_writer saves them off the request path"""
+    _cal_dirty.set()
 
-def send_command(esp_id, message):
-    load_devices()
-    if esp_id in esp_devices:
-        ip = esp_devices[esp_id]['ip']
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.sendto(message.encode(), (ip, COMMAND_PORT))
-        return True
-    return False
+def send_command(esp_id, message, urgent=False):
+    """Queue a command (str or pre-encoded bytes) for an ESP; False if it isn't online. urgent skips the batching wait"""
+    global _devices_checked
+    # Runs per X-Plane value, so stat the devices file at most every FILE_RECHECK seconds
+    now = time.monotonic()
+    if now - _devices_checked >= FILE_RECHECK:
+        _devices_checked = now
+        load_devices()
+    device = esp_devices.get(esp_id)
+    if not device:
+        return False
+    if isinstance(message, str):
+        message = message.encode()
+    try:
+        _send_queue.put_nowait(((device['ip'], COMMAND_PORT), message))
+    except queue.Full:
+        log.warning("Send queue full, dropped command for %s", esp_id)
+    if urgent:
+        _flush_now.set()
+    return True
+
+def udp_sender():
+    """Send queued ESP commands in batches (sendmmsg) so request threads never wait on sendto"""
+    while True:
+        batch = [_send_queue.get()]
+        _flush_now.wait(SEND_WINDOW)
+        _flush_now.clear()
+        while len(batch) < SEND_BATCH:
+            try:
+                batch.append(_send_queue.get_nowait())
+            except queue.Empty:
+                break
+        messages = [(message, addr) for addr, message in batch]
+        try:
+            send_batch(_UDP_SOCK, messages)
+        except OSError as e:
+            log.error("Error sending ESP commands: %s", e)
+
+def value_sender():
+    """Send queued X-Plane values to the ESPs, skipping repeats of the value a motor already has"""
+    last_sent = {}  # (esp_id, motor_id) -> (value, time sent)
+    while True:
+        esp_id, motor_id, value = _value_queue.get()
+        key = (esp_id, motor_id)
+        now = time.monotonic()
+        last = last_sent.get(key)
+        if last and last[0] == value and now - last[1] < VALUE_RESEND:
+            continue
+        if send_command(esp_id, b"VALUE:%d:%d" % (motor_id, value)):
+            last_sent[key] = (value, now)
+
+# Static motor bounds reported by GET /api/bounds/<esp_id>/<motor_id>
+MOTOR_BOUNDS = {
+    'ESP_TurnIndicator': {
+        'motor_0': {'min': 340, 'max': 20},
+        'motor_1': {'min': 342, 'max': 18}
+    },
+    'ESP_AttitudeIndicator': {
+        'motor_0': {'min': 160, 'max': 200},
+        'motor_1': {'min': 160, 'max': 200}
+    }
+}
+
+def _json_body(obj):
+    """Serialize obj exactly as jsonify would, for responses rendered once at import"""
+    return app.json.dumps(obj).encode() + b'\n'
+
+# INSTRUMENT_METADATA and MOTOR_BOUNDS never change, so their responses are rendered once
+_DEVICE_INFO_JSON = {esp_id: _json_body(info) for esp_id, info in INSTRUMENT_METADATA.items()}
+_UNKNOWN_DEVICE_JSON = _json_body({'motor_count': 1, 'type': 'unknown'})
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+@functools.lru_cache(maxsize=64)
+def _bounds_response(esp_id, motor_id):
+    """Return the (body, status, headers) reply for GET /api/bounds; rendered once per motor"""
+    bounds = MOTOR_BOUNDS.get(esp_id, {}).get(f'motor_{motor_id}')
+    if bounds is not None:
+        return _json_body(bounds), 200, _JSON_HEADERS
+    return _json_body({'status': 'error', 'message': 'No bounds info for this motor'}), 404, _JSON_HEADERS
 
 # VSI calibration: maps FPM values to angles
 VSI_CALIBRATION = [
@@ -88,7 +360,7 @@ VSI_CALIBRATION = [
     (2000, 82),
 ]
 
-def fps_to_angle(fps_value):
+def _interpolate_vsi(fps_value):
     """Convert vertical speed (FPM - feet per minute) to dial angle using calibration table"""
     if fps_value <= -2000:
         return 98
@@ -112,21 +384,51 @@ def fps_to_angle(fps_value):
     
     return 270
 
+# Dial angle for every whole FPM in -2000..2000, indexed by fps + 2000
+_VSI_LUT = array('h', map(_interpolate_vsi, range(-2000, 2001)))
+
+_VSI_MOVE = b"MOVE:%d:%d:0:360"  # VSI moves always span the full dial
+
+def fps_to_angle(fps_value):
+    """Convert vertical speed (FPM) to dial angle via the precomputed table"""
+    return _VSI_LUT[max(-2000, min(2000, int(fps_value))) + 2000]
+
+# Airspeed calibration: knots -> dial angle, split into parallel lists for bisect
+AIRSPEED_CALIBRATION = [(40, 32), (60, 72), (80, 116), (100, 161), (120, 203), (160, 265), (200, 315)]
+_AIRSPEED_CAL_V = [v for v, _ in AIRSPEED_CALIBRATION]
+_AIRSPEED_CAL_A = [a for _, a in AIRSPEED_CALIBRATION]
+
 def value_to_angle(value):
     """Convert airspeed value to angle using calibration"""
-    airspeed_cal = [(40, 32), (60, 72), (80, 116), (100, 161), (120, 203), (160, 265), (200, 315)]
-    if value <= airspeed_cal[0][0]:
-        return airspeed_cal[0][1]
-    if value >= airspeed_cal[-1][0]:
-        return airspeed_cal[-1][1]
+    if value <= _AIRSPEED_CAL_V[0]:
+        return _AIRSPEED_CAL_A[0]
+    if value >= _AIRSPEED_CAL_V[-1]:
+        return _AIRSPEED_CAL_A[-1]
     
-    for i in range(len(airspeed_cal) - 1):
-        v1, a1 = airspeed_cal[i]
-        v2, a2 = airspeed_cal[i + 1]
-        if v1 <= value <= v2:
-            ratio = (value - v1) / (v2 - v1)
-            return int(a1 + ratio * (a2 - a1))
-    return airspeed_cal[0][1]
+    i = bisect.bisect_left(_AIRSPEED_CAL_V, value)
+    v1, v2 = _AIRSPEED_CAL_V[i - 1], _AIRSPEED_CAL_V[i]
+    a1, a2 = _AIRSPEED_CAL_A[i - 1], _AIRSPEED_CAL_A[i]
+    ratio = (value - v1) / (v2 - v1)
+    return int(a1 + ratio * (a2 - a1))
+
+def request_data():
+    """Return the POSTed JSON object, or None if the body isn't one"""
+    data = request.get_json(force=True, silent=True)
+    return data if isinstance(data, dict) else None
+
+def bad_body():
+    """400 reply for a POST whose body isn't a JSON object"""
+    return jsonify({'status': 'error', 'message': 'JSON object body required'}), 400
+
+def valid_point(point):
+    """True if point is a calibration point dict with a numeric value"""
+    return (isinstance(point, dict) and isinstance(point.get('value'), (int, float))
+            and not isinstance(point['value'], bool))
+
+@app.before_request
+def stamp_request():
+    """Read the clock once per request; handlers use g.now"""
+    g.now = time.time()
 
 @app.route('/')
 def index():
@@ -148,75 +450,56 @@ def health():
 
 @app.route('/api/device-info/<esp_id>')
 def get_device_info(esp_id):
-    info = INSTRUMENT_METADATA.get(esp_id, {'motor_count': 1, 'type': 'unknown'})
-    return jsonify(info)
+    return app.response_class(_DEVICE_INFO_JSON.get(esp_id, _UNKNOWN_DEVICE_JSON), mimetype=app.json.mimetype)
 
 @app.route('/api/devices')
 def get_devices():
     load_devices()
+    return conditional_json('devices', _build_devices_payload)
+
+def _build_devices_payload():
+    """Build the dashboard device list"""
     devices = []
-    now = time.time()
-    
-    xplane_total_messages = sum(xplane_counters.values())
-    xplane_online = False
-    xplane_last_seen = '-'
-    if dref_data:
-        latest_dref_time = max(v['timestamp'] for v in dref_data.values())
-        elapsed = now - latest_dref_time
-        if elapsed < XPLANE_TIMEOUT:
-            xplane_online = True
-        hours = int(elapsed // 3600)
-        minutes = int((elapsed % 3600) // 60)
-        seconds = int(elapsed % 60)
-        xplane_last_seen = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    now = g.now
     
+    xplane_total_messages = sum(_xplane_cnt) + sum(xplane_counters.values())
+    drefs = snapshot(dref_data)
+    # last_seen is a time.time() stamp (None if never seen); the dashboard compares it
+    # against X-Server-Time and timeout to show elapsed time and online status
     devices.append({
         'id': 'X-Plane',
         'ip': 'localhost',
         'uptime': '-',
-        'last_seen': xplane_last_seen,
+        'last_seen': max(ts for _, ts in drefs.values()) if drefs else None,
+        'timeout': XPLANE_TIMEOUT,
         'is_xplane': True,
-        'xplane_messages': xplane_total_messages,
-        'online': xplane_online
+        'xplane_messages': xplane_total_messages
     })
     
-    instrument_order = [
-        'ESP_Airspeed',
-        'ESP_AttitudeIndicator',
-        'ESP_Altimeter',
-        'ESP_TurnIndicator',
-        'ESP_Gyrocompass',
-        'ESP_VertSpeed',
-        'ESP_Inputs',
-    ]
-    
-    for esp_id in instrument_order:
-        if esp_id in esp_devices:
-            info = esp_devices[esp_id]
-            last_seen_ts = info.get('last_seen', time.time())
+    encoders = snapshot(encoder_events)
+    no_encoders = {}  # Shared by every non-input row; the list is serialized straight away
+    devices_local = esp_devices
+    cal_get = calibrations.get
+    counts = _xplane_cnt
+    esp_idx = _ESP_IDX
+    for esp_id in INSTRUMENT_ORDER:
+        info = devices_local.get(esp_id)
+        if info is not None:
             uptime_str = info.get('uptime', '?')
             
             if isinstance(uptime_str, (int, float)):
                 uptime_str = str(int(uptime_str))
             
-            elapsed = now - last_seen_ts
-            is_online = elapsed < TIMEOUT
-            
-            hours = int(elapsed // 3600)
-            minutes = int((elapsed % 3600) // 60)
-            seconds = int(elapsed % 60)
-            last_seen_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            
             device_data = {
                 'id': esp_id,
                 'ip': info.get('ip', '?'),
                 'uptime': uptime_str,
-                'last_seen': last_seen_str,
-                'calibration': calibrations.get(esp_id, {}),
-                'xplane_messages': xplane_counters.get(esp_id, 0),
+                'last_seen': info.get('last_seen', now),
+                'timeout': TIMEOUT,
+                'calibration': cal_get(esp_id, {}),
+                'xplane_messages': counts[esp_idx[esp_id]],
                 'is_xplane': False,
-                'online': is_online,
-                'encoders': encoder_events.copy() if esp_id == 'ESP_Inputs' else {}
+                'encoders': encoders if esp_id == 'ESP_Inputs' else no_encoders
             }
             
             devices.append(device_data)
@@ -225,24 +508,26 @@ def get_devices():
                 'id': esp_id,
                 'ip': '?',
                 'uptime': '?',
-                'last_seen': '-',
-                'calibration': calibrations.get(esp_id, {}),
+                'last_seen': None,
+                'timeout': TIMEOUT,
+                'calibration': cal_get(esp_id, {}),
                 'xplane_messages': 0,
                 'is_xplane': False,
-                'online': False,
-                'encoders': encoder_events.copy() if esp_id == 'ESP_Inputs' else {}
+                'encoders': encoders if esp_id == 'ESP_Inputs' else no_encoders
             }
             
             devices.append(device_data)
     
-    return jsonify(devices)
+    return devices
 
 @app.route('/api/move', methods=['POST'])
 def move_motor():
-    data = request.json
+    data = request_data()
+    if data is None:
+        return bad_body()
     esp_id = data.get('esp_id')
     
-    if esp_id == 'ESP_Inputs':
+    if esp_id in NO_MOTOR_ESPS:
         return jsonify({'status': 'error', 'message': 'ESP_Inputs has no motors'}), 400
     
     motor_id = int(data.get('motor_id', 0))
@@ -256,7 +541,9 @@ def move_motor():
 
 @app.route('/api/move-vsi', methods=['POST'])
 def move_vsi():
-    data = request.json
+    data = request_data()
+    if data is None:
+        return bad_body()
     esp_id = data.get('esp_id')
     motor_id = data.get('motor_id', 0)
     fps_value = data.get('fps')
@@ -269,13 +556,15 @@ def move_vsi():
     
     angle = fps_to_angle(int(fps_value))
     
-    if send_command(esp_id, f"MOVE:{motor_id}:{angle}:0:360"):
+    if send_command(esp_id, _VSI_MOVE % (int(motor_id), angle)):
         return jsonify({'status': 'ok', 'fps': fps_value, 'angle': angle})
     return jsonify({'status': 'error', 'message': 'ESP not found'}), 404
 
 @app.route('/api/xplane-convert', methods=['POST'])
 def xplane_convert():
-    data = request.json
+    data = request_data()
+    if data is None:
+        return bad_body()
     esp_id = data.get('esp_id')
     motor_id = int(data.get('motor_id', 0))
     value = data.get('value')
@@ -283,7 +572,7 @@ def xplane_convert():
     if value is None:
         return jsonify({'status': 'error', 'message': 'value required'}), 400
     
-    if send_command(esp_id, f"VALUE:{motor_id}:{int(value)}"):
+    if send_command(esp_id, b"VALUE:%d:%d" % (motor_id, int(value))):
         if esp_id == 'ESP_Airspeed':
             angle = value_to_angle(int(value))
         else:
@@ -294,89 +583,96 @@ def xplane_convert():
 @app.route('/api/bounds/<esp_id>/<int:motor_id>', methods=['GET', 'POST'])
 def motor_bounds(esp_id, motor_id):
     if request.method == 'POST':
-        data = request.json
+        data = request_data()
+        if data is None:
+            return bad_body()
         min_angle = data.get('min_angle')
         max_angle = data.get('max_angle')
         
         if min_angle is None or max_angle is None:
             return jsonify({'status': 'error', 'message': 'min_angle and max_angle required'}), 400
         
-        if send_command(esp_id, f"BOUNDS:{motor_id}:{min_angle}:{max_angle}"):
+        if send_command(esp_id, f"BOUNDS:{motor_id}:{min_angle}:{max_angle}", urgent=True):
             return jsonify({'status': 'ok', 'esp_id': esp_id, 'motor_id': motor_id, 'min': min_angle, 'max': max_angle})
         return jsonify({'status': 'error', 'message': 'ESP not found'}), 404
     else:
-        bounds = {
-            'ESP_TurnIndicator': {
-                'motor_0': {'min': 340, 'max': 20},
-                'motor_1': {'min': 342, 'max': 18}
-            },
-            'ESP_AttitudeIndicator': {
-                'motor_0': {'min': 160, 'max': 200},
-                'motor_1': {'min': 160, 'max': 200}
-            }
-        }
-        if esp_id in bounds:
-            motor_key = f'motor_{motor_id}'
-            if motor_key in bounds[esp_id]:
-                return jsonify(bounds[esp_id][motor_key])
-        return jsonify({'status': 'error', 'message': 'No bounds info for this motor'}), 404
+        return _bounds_response(esp_id, motor_id)
 
 @app.route('/api/xplane', methods=['POST'])
 def xplane_data():
-    data = request.json
+    global _mapping_checked
+    data = request_data()
+    if data is None:
+        return bad_body()
     field_name = data.get('field_name', '')
     value = data.get('value', 0)
     esp_id = data.get('esp_id')
     motor_id = data.get('motor_id', 0)
     
-    dref_data[field_name] = {'value': value, 'timestamp': time.time()}
+    with _live_lock:
+        dref_data[field_name] = (value, g.now)
+    state_changed()
     
     if not esp_id:
-        for instrument_name, config in instrument_mapping.get('instruments', {}).items():
-            motors = config.get('motors', {})
-            for mid, motor_config in motors.items():
-                if motor_config.get('dref') == field_name:
-                    esp_id = config.get('esp_id')
-                    motor_id = int(mid)
-                    break
-            if esp_id:
-                break
+        # Hottest endpoint, so stat the mapping file at most every FILE_RECHECK seconds
+        now = time.monotonic()
+        if now - _mapping_checked >= FILE_RECHECK:
+            _mapping_checked = now
+            load_instrument_mapping()
+        hit = _dref_index.get(field_name)
+        if hit:
+            esp_id, motor_id = hit
     
     if esp_id:
-        xplane_counters[esp_id] = xplane_counters.get(esp_id, 0) + 1
+        idx = _ESP_IDX.get(esp_id)
+        if idx is not None:
+            _xplane_cnt[idx] += 1
+        else:
+            xplane_counters[esp_id] = xplane_counters.get(esp_id, 0) + 1
     
     if not data.get('esp_id') and esp_id:
-        send_command(esp_id, f"VALUE:{motor_id}:{int(value)}")
+        try:
+            _value_queue.put_nowait((esp_id, int(motor_id), int(value)))
+        except queue.Full:
+            pass  # value_sender is behind; a newer value will follow
     
     return jsonify({'status': 'ok'})
 
 @app.route('/api/zero', methods=['POST'])
 def zero_motor():
-    data = request.json
+    data = request_data()
+    if data is None:
+        return bad_body()
     esp_id = data.get('esp_id')
     
-    if esp_id == 'ESP_Inputs':
+    if esp_id in NO_MOTOR_ESPS:
         return jsonify({'status': 'error', 'message': 'ESP_Inputs has no motors'}), 400
     
     motor_id = data.get('motor_id', 0)
     
-    if send_command(esp_id, f"ZERO:{motor_id}"):
+    if send_command(esp_id, f"ZERO:{motor_id}", urgent=True):
         return jsonify({'status': 'ok'})
     return jsonify({'status': 'error', 'message': 'ESP not found'}), 404
 
 @app.route('/api/calibration/<esp_id>', methods=['GET', 'POST'])
 def calibration(esp_id):
     if request.method == 'POST':
-        data = request.json
+        data = request_data()
+        if data is None:
+            return bad_body()
+        points = data.get('points', [])
+        if not isinstance(points, list) or not all(map(valid_point, points)):
+            return jsonify({'status': 'error', 'message': 'points must be objects with a numeric value'}), 400
         if esp_id not in calibrations:
             calibrations[esp_id] = {}
-        calibrations[esp_id]['points'] = data.get('points', [])
+        # Stored sorted by value so single-point adds can insert in place
+        calibrations[esp_id]['points'] = sorted(points, key=_point_value)
         calibrations[esp_id]['min_angle'] = data.get('min_angle', 0)
         calibrations[esp_id]['max_angle'] = data.get('max_angle', 360)
         save_calibrations()
+        state_changed()
         
-        cal_json = json.dumps(calibrations[esp_id])
-        send_command(esp_id, f"CAL:{cal_json}")
+        send_command(esp_id, b"CAL:" + json_dumps(calibrations[esp_id]))
         
         return jsonify({'status': 'ok'})
     
@@ -390,24 +686,30 @@ def calibration_json(esp_id):
 
 @app.route('/api/drefs')
 def get_drefs():
-    now = time.time()
-    return jsonify([{'dref': d, 'value': v['value'], 'elapsed': now - v['timestamp']} for d, v in dref_data.items()])
+    def build():
+        return [{'dref': d, 'value': value, 'timestamp': ts} for d, (value, ts) in snapshot(dref_data).items()]
+    return conditional_json('drefs', build)
 
 @app.route('/api/instrument-mapping')
 def get_instrument_mapping():
     return jsonify(instrument_mapping)
 
+def _point_value(point):
+    return point['value']
+
 @app.route('/api/calibration/<esp_id>/point', methods=['POST'])
 def add_calibration_point(esp_id):
+    point = request.get_json(force=True, silent=True)
+    if not valid_point(point):
+        return jsonify({'status': 'error', 'message': 'point must be an object with a numeric value'}), 400
     if esp_id not in calibrations:
         calibrations[esp_id] = {'points': []}
     if 'points' not in calibrations[esp_id]:
         calibrations[esp_id]['points'] = []
     
-    point = request.json
-    calibrations[esp_id]['points'].append(point)
-    calibrations[esp_id]['points'].sort(key=lambda p: p['value'])
+    bisect.insort(calibrations[esp_id]['points'], point, key=_point_value)
     save_calibrations()
+    state_changed()
     return jsonify({'status': 'ok'})
 
 @app.route('/api/calibration/<esp_id>/point/<int:idx>', methods=['DELETE'])
@@ -416,33 +718,42 @@ def delete_calibration_point(esp_id, idx):
         if 0 <= idx < len(calibrations[esp_id]['points']):
             calibrations[esp_id]['points'].pop(idx)
             save_calibrations()
+            state_changed()
             return jsonify({'status': 'ok'})
     return jsonify({'status': 'error'}), 404
 
 @app.route('/api/encoder_event', methods=['POST'])
 def encoder_event():
-    global encoder_events
-    data = request.json
+    data = request_data()
+    if data is None:
+        return bad_body()
     encoder_name = data.get('encoder')
     value = data.get('value')
     button = data.get('button')
     
     if encoder_name:
-        encoder_events[encoder_name] = {
-            'value': value,
-            'button': button,
-            'timestamp': time.time()
-        }
-        print(f"[ENCODER] {encoder_name}: value={value}, button={button}")
+        with _live_lock:
+            encoder_events[encoder_name] = {
+                'value': value,
+                'button': button,
+                'timestamp': g.now
+            }
+        log.debug("[ENCODER] %s: value=%s, button=%s", encoder_name, value, button)
+        state_changed()
     
     return jsonify({'status': 'ok'})
 
+# Loaded at import so gunicorn (see start.sh) gets the same startup as running this file directly
+atexit.register(setup_logging().stop)
+load_calibrations()
+load_instrument_mapping()
+Thread(target=calibration_writer, daemon=True).start()
+Thread(target=value_sender, daemon=True).start()
+Thread(target=udp_sender, daemon=True).start()
+atexit.register(flush_calibrations)
+
 if __name__ == '__main__':
-    import logging
-    log = logging.getLogger('werkzeug')
-    log.setLevel(logging.INFO)
-    
-    load_calibrations()
-    load_instrument_mapping()
+    logging.getLogger('werkzeug').setLevel(logging.INFO)
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server; one thread per request so a slow handler never holds up the X-Plane posts
+    app.run(host='0.0.0.0', port=5000, debug=DEBUG, use_reloader=False, threaded=True)